@@ -0,0 +1,107 @@
+import json
+import os
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+class _BadLine:
+    def __init__(self, error):
+        self.error = error
+
+
+async def read_batch(request: Request, max_items=BATCH_MAX_ITEMS):
+    """Parse a JSON array or NDJSON body into a list of raw items.
+
+    NDJSON lines that are not valid JSON are returned as ``_BadLine`` markers so the
+    caller reports them per item instead of rejecting the whole batch.
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_TYPES:
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="NDJSON body must be UTF-8")
+        items = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(_BadLine(str(e)))
+    else:
+        try:
+            items = json.loads(body or b"null")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(items) > max_items:
+        raise HTTPException(status_code=413, detail=f"At most {max_items} items per batch")
+    return items
+
+
+def validate_batch(items, model, check=None):
+    """Validate every item against ``model`` in one pass.
+
+    ``check(obj)`` may return an error string for rules the model does not express.
+    Returns ``(valid, results)``: ``valid`` is a list of ``(index, obj)`` and
+    ``results`` has one entry per item, filled in for the failures.
+    """
+    valid, results = [], [None] * len(items)
+    for index, item in enumerate(items):
+        if isinstance(item, _BadLine):
+            results[index] = {"index": index, "status": "error", "detail": f"Invalid JSON: {item.error}"}
+            continue
+        if not isinstance(item, dict):
+            results[index] = {"index": index, "status": "error", "detail": "Item must be an object"}
+            continue
+        try:
+            obj = model(**item)
+        except ValidationError as e:
+            detail = "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+            results[index] = {"index": index, "status": "error", "detail": detail}
+            continue
+        error = check(obj) if check else None
+        if error:
+            results[index] = {"index": index, "status": "error", "detail": error}
+            continue
+        valid.append((index, obj))
+    return valid, results
+
+
+def insert_batch(collection, indexed_docs, results):
+    """``insert_many(ordered=False)`` and record the outcome of each document in ``results``.
+
+    Returns the documents that were written (with their ``_id``), in input order.
+    """
+    if not indexed_docs:
+        return []
+    docs = [doc for _, doc in indexed_docs]
+    failed = {}
+    try:
+        collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        failed = {error["index"]: error.get("errmsg", "Write failed") for error in e.details.get("writeErrors", [])}
+    inserted = []
+    for position, (index, doc) in enumerate(indexed_docs):
+        if position in failed:
+            results[index] = {"index": index, "status": "error", "detail": failed[position]}
+        else:
+            results[index] = {"index": index, "status": "inserted", "id": str(doc["_id"])}
+            inserted.append(doc)
+    return inserted
+
+
+def summarize(results):
+    inserted = sum(1 for result in results if result["status"] == "inserted")
+    return {"status": "success", "inserted": inserted, "failed": len(results) - inserted, "results": results}
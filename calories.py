@@ -0,0 +1,136 @@
+import argparse
+import bisect
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+MET_TABLE_FILE = os.getenv("MET_TABLE_FILE", os.path.join("data", "met_table.json"))
+DEFAULT_WEIGHT_KG = 70.0
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_exercise_name(name):
+    return _WHITESPACE.sub(" ", str(name or "").casefold()).strip()
+
+
+class METTable:
+    """MET values per exercise and intensity level, laid out for vectorized lookups.
+
+    ``levels`` maps each level name to the highest 1-10 intensity it covers, in
+    ascending order. Row 0 of ``values`` holds the defaults used for unknown exercises;
+    a missing intensity reads the middle level.
+    """
+
+    def __init__(self, levels, default, exercises, aliases=None):
+        self.level_names = tuple(levels)
+        self.bounds = [levels[name] for name in self.level_names]
+        self.default_level = len(self.level_names) // 2
+        self.rows = {normalize_exercise_name(name): i + 1 for i, name in enumerate(exercises)}
+        for alias, target in (aliases or {}).items():
+            self.rows[normalize_exercise_name(alias)] = self.rows[normalize_exercise_name(target)]
+        self.values = np.array(
+            [[default[level] for level in self.level_names]]
+            + [[mets[level] for level in self.level_names] for mets in exercises.values()],
+            dtype=float
+        )
+
+    @classmethod
+    def from_file(cls, path=MET_TABLE_FILE):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["levels"], data["default"], data["exercises"], data.get("aliases"))
+
+    def __len__(self):
+        return len(self.values) - 1
+
+    def met(self, exercise, intensity=None):
+        row = self.rows.get(normalize_exercise_name(exercise), 0)
+        if intensity is None:
+            column = self.default_level
+        else:
+            column = min(bisect.bisect_left(self.bounds, max(intensity, 1)), len(self.bounds) - 1)
+        return float(self.values[row, column])
+
+    def row_indices(self, exercises):
+        # Names repeat heavily, so each distinct one is normalized once and the rest are
+        # dict hits; this is linear, unlike sorting the names with np.unique.
+        memo = {}
+
+        def row(name):
+            index = memo.get(name)
+            if index is None:
+                index = memo[name] = self.rows.get(normalize_exercise_name(name), 0)
+            return index
+
+        if isinstance(exercises, np.ndarray):
+            exercises = exercises.tolist()
+        return np.fromiter(map(row, exercises), dtype=np.intp, count=len(exercises))
+
+    def level_indices(self, intensities):
+        intensities = np.asarray(intensities, dtype=float)
+        columns = np.searchsorted(self.bounds, np.clip(intensities, 1, self.bounds[-1]), side="left")
+        return np.where(np.isnan(intensities), self.default_level, columns)
+
+    def mets(self, exercises, intensities=None):
+        rows = self.row_indices(exercises)
+        if intensities is None:
+            return self.values[rows, self.default_level]
+        return self.values[rows, self.level_indices(intensities)]
+
+
+met_table = METTable.from_file()
+
+
+def estimate_one(exercise, duration, weight=None, intensity=None, table=None):
+    """kcal for one session: MET x kg x minutes / 60."""
+    table = table or met_table
+    weight = weight if weight and weight > 0 else DEFAULT_WEIGHT_KG
+    return table.met(exercise, intensity) * weight * (duration or 0) / 60
+
+
+def estimate_calories(exercises, durations, weights=None, intensities=None, table=None):
+    """kcal for a batch of sessions as a float array.
+
+    ``weights`` and ``intensities`` may contain None (read as NaN), which fall back to
+    DEFAULT_WEIGHT_KG and the table's middle intensity level.
+    """
+    table = table or met_table
+    durations = np.nan_to_num(np.asarray(durations, dtype=float))
+    if weights is None:
+        weights = np.full(durations.shape, DEFAULT_WEIGHT_KG)
+    else:
+        weights = np.asarray(weights, dtype=float)
+        weights = np.where(np.isnan(weights) | (weights <= 0), DEFAULT_WEIGHT_KG, weights)
+    return table.mets(exercises, intensities) * weights * durations / 60
+
+
+def _bench(sessions, seed=0):
+    rng = np.random.default_rng(seed)
+    names = np.array(list(met_table.rows) + ["unlisted activity"])
+    exercises = names[rng.integers(0, len(names), sessions)]
+    durations = rng.integers(5, 120, sessions)
+    weights = rng.uniform(45, 120, sessions)
+    intensities = rng.integers(1, 11, sessions)
+
+    start = time.perf_counter()
+    batch = estimate_calories(exercises, durations, weights, intensities)
+    batch_seconds = time.perf_counter() - start
+
+    sample = min(sessions, 100_000)
+    start = time.perf_counter()
+    scalar = [estimate_one(e, d, w, i) for e, d, w, i in zip(exercises[:sample].tolist(), durations[:sample].tolist(), weights[:sample].tolist(), intensities[:sample].tolist())]
+    scalar_seconds = (time.perf_counter() - start) * sessions / sample
+
+    assert np.allclose(batch[:sample], scalar)
+    print(f"{sessions} sessions: batch {batch_seconds:.3f}s, per-session loop ~{scalar_seconds:.3f}s (extrapolated from {sample})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batch calorie estimation")
+    parser.add_argument("--sessions", type=int, default=1_000_000)
+    args = parser.parse_args()
+    _bench(args.sessions)
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, monitoring
+
+logger = logging.getLogger(__name__)
+
+# Settings are read at import time, before main.py gets to its own load_dotenv().
+load_dotenv()
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "healthchain_db")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0"))  # 0 = no timeout
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0"))  # 0 = wait forever
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")  # e.g. primaryPreferred, secondaryPreferred
+# Keep at or below MONGO_MAX_POOL_SIZE, otherwise executor threads queue for a connection.
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "32"))
+
+
+# --- Pool Monitoring ---
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Counts connection pool events; pymongo calls these from its own threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = Counter()
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+
+    def _record(self, event, open_=0, checked_out=0, waiting=0):
+        with self._lock:
+            self._events[event] += 1
+            self.open += open_
+            self.checked_out += checked_out
+            self.waiting += waiting
+
+    def pool_created(self, event):
+        self._record("pools_created")
+
+    def pool_ready(self, event):
+        self._record("pools_ready")
+
+    def pool_cleared(self, event):
+        self._record("pools_cleared")
+
+    def pool_closed(self, event):
+        self._record("pools_closed")
+
+    def connection_created(self, event):
+        self._record("connections_created", open_=1)
+
+    def connection_ready(self, event):
+        self._record("connections_ready")
+
+    def connection_closed(self, event):
+        self._record("connections_closed", open_=-1)
+
+    def connection_check_out_started(self, event):
+        self._record("checkouts_started", waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._record("checkouts_failed", waiting=-1)
+
+    def connection_checked_out(self, event):
+        self._record("checkouts", checked_out=1, waiting=-1)
+
+    def connection_checked_in(self, event):
+        self._record("checkins", checked_out=-1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_pool_size": MONGO_MAX_POOL_SIZE,
+                "min_pool_size": MONGO_MIN_POOL_SIZE,
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "waiting": self.waiting,
+                **self._events,
+            }
+
+
+pool_stats = PoolStats()
+
+# --- Database Setup ---
+def create_client(**overrides):
+    """A MongoClient built from the settings above; ``overrides`` replace individual options."""
+    options = dict(
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS or None,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS or None,
+        readPreference=MONGO_READ_PREFERENCE,
+        # tz_aware: timestamps are stored as UTC dates and come back as aware datetimes.
+        tz_aware=True
+    )
+    options.update(overrides)
+    return MongoClient(MONGO_URI, **options)
+
+# The one MongoClient for the process. It is thread-safe and owns the connection pool,
+# so everything (handlers, background jobs, dependencies) must share it. Worker
+# processes must not reuse it across fork and open their own with create_client().
+try:
+    client = create_client(event_listeners=[pool_stats])
+    client.server_info()  # Test connection
+    logger.info("MongoDB connection established")
+except Exception as e:
+    logger.error(f"MongoDB connection failed: {str(e)}")
+    raise ConnectionError("Failed to connect to MongoDB")
+
+db = client[MONGO_DB_NAME]
+users_collection = db["users"]
+logs_collection = db["health_logs"]
+meds_collection = db["medications"]
+nutrition_collection = db["nutrition"]
+fitness_collection = db["fitness"]
+reports_collection = db["reports"]
+forum_collection = db["forum"]
+doctors_collection = db["doctors"]
+appointments_collection = db["appointments"]
+nutrition_cache_collection = db["nutrition_cache"]
+log_aggregates_collection = db["health_log_aggregates"]
+fitness_weekly_collection = db["fitness_weekly"]
+# Per-user chains live in "ledger". The old "blockchain" collection held a single chain
+# shared by all users, replaced wholesale on every save and with no owner on its blocks,
+# so it cannot be split into ledgers; nothing reads or writes it and it can be dropped.
+ledger_collection = db["ledger"]
+ledger_checkpoints_collection = db["ledger_checkpoints"]
+ledger_ranges_collection = db["ledger_ranges"]
+blockchain_meta_collection = db["blockchain_meta"]
+email_outbox_collection = db["email_outbox"]
+
+# --- Async Access ---
+# pymongo is blocking, so every call made from an async handler is pushed onto this
+# dedicated pool. The event loop keeps serving other requests while a query is in
+# flight, and the pool size bounds how many DB calls can be outstanding at once.
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="mongo")
+
+async def run_db(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, partial(func, *args, **kwargs))
+
+async def find_all(collection, *args, **kwargs):
+    return await run_db(lambda: list(collection.find(*args, **kwargs)))
+
+async def aggregate_all(collection, pipeline, **kwargs):
+    return await run_db(lambda: list(collection.aggregate(pipeline, **kwargs)))
+
+def get_db():
+    """FastAPI dependency returning the shared database handle."""
+    return db
+
+def close():
+    db_executor.shutdown(wait=False)
+    client.close()
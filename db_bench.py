@@ -0,0 +1,228 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+BENCH_PREFIX = "bench_"
+
+
+def use_mongomock():
+    """Swap pymongo's client for mongomock; must run before anything imports database."""
+    import mongomock
+    import pymongo
+    pymongo.MongoClient = mongomock.MongoClient
+
+
+class SlowCollection:
+    """Collection wrapper that adds a fixed round-trip time to every call.
+
+    mongomock answers in-process, so this stands in for the network wait; like a socket
+    read it sleeps with the GIL released, which is what lets executor threads overlap.
+    """
+
+    def __init__(self, collection, latency):
+        self._collection = collection
+        self._latency = latency
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not self._latency or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            time.sleep(self._latency)
+            return attr(*args, **kwargs)
+        return call
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+async def _loop_lag(samples, stop, interval=0.005):
+    """How late a 5ms timer fires: the delay any other request would see on the loop."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
+
+
+async def _session_lookups(run_db, collection, mode, clients, requests, users):
+    async def client(offset):
+        for i in range(requests):
+            query = {"session_id": f"session-{(offset + i) % users}"}
+            if mode == "direct":
+                collection.find_one(query)
+            else:
+                await run_db(collection.find_one, query)
+            await asyncio.sleep(0)
+
+    lag, stop = [], asyncio.Event()
+    probe = asyncio.create_task(_loop_lag(lag, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(client(n * requests) for n in range(clients)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+    return clients * requests / elapsed, max(lag, default=0.0), percentile(lag, 99) if lag else 0.0
+
+
+def _bench_executor(client_counts, requests, users, latency):
+    """Session lookups from N concurrent clients, blocking the loop vs through run_db."""
+    import database
+
+    raw = database.db[BENCH_PREFIX + "users"]
+    raw.drop()
+    raw.insert_many([{"username": f"user{i}", "session_id": f"session-{i}"} for i in range(users)])
+    raw.create_index("session_id")
+    collection = SlowCollection(raw, latency)
+    try:
+        for clients in client_counts:
+            for mode in ("direct", "run_db"):
+                throughput, lag_max, lag_p99 = asyncio.run(
+                    _session_lookups(database.run_db, collection, mode, clients, requests, users)
+                )
+                print(f"{clients:>3} clients, {mode:>6}: {throughput:8.0f} lookups/s, "
+                      f"loop lag p99 {lag_p99 * 1000:7.1f}ms, max {lag_max * 1000:7.1f}ms")
+    finally:
+        raw.drop()
+        database.close()
+
+
+def _synthetic_logs(user_id, count):
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    moods = ("Happy", "Neutral", "Tired", "Stressed")
+    for i in range(count):
+        yield {"user_id": user_id, "timestamp": start + timedelta(hours=i), "mood": moods[i % 4],
+               "sleep": 7.5, "water": 2, "exercise": 30, "note": f"Synthetic log {i}"}
+
+
+def _payload_bytes(docs):
+    return len(json.dumps(docs, default=str).encode("utf-8"))
+
+
+def _bench_pages(docs, samples, page_size, latency):
+    """fetch_page at spread cursor depths vs one unpaginated find over ``docs`` logs."""
+    import database
+    from pagination import PageParams, fetch_page
+
+    raw = database.db[BENCH_PREFIX + "logs"]
+    raw.drop()
+    ids = []
+    batch = []
+    for log in _synthetic_logs("bench-user", docs):
+        batch.append(log)
+        if len(batch) == 10_000:
+            ids.extend(raw.insert_many(batch).inserted_ids)
+            batch = []
+    if batch:
+        ids.extend(raw.insert_many(batch).inserted_ids)
+    raw.create_index([("user_id", 1), ("_id", -1)])
+    collection = SlowCollection(raw, latency)
+    fields = ("mood", "sleep", "water", "exercise", "note", "timestamp")
+
+    async def run():
+        # Cursors spread from the newest page to the oldest; None is the first page.
+        cursors = [None] + [str(ids[len(ids) - 1 - (len(ids) - page_size) * n // max(samples - 1, 1)]) for n in range(1, samples)]
+        latencies, sizes = [], []
+        for after in cursors:
+            page = PageParams(after=after, limit=page_size, fields=None)
+            start = time.perf_counter()
+            page_docs, _ = await fetch_page(collection, {"user_id": "bench-user"}, page, fields)
+            latencies.append(time.perf_counter() - start)
+            sizes.append(_payload_bytes(page_docs))
+        print(f"{docs} docs, fetch_page limit={page_size}: p50 {percentile(latencies, 50) * 1000:.1f}ms, "
+              f"p99 {percentile(latencies, 99) * 1000:.1f}ms over {len(cursors)} pages, "
+              f"payload {max(sizes) / 1024:.1f} KiB per page")
+
+        start = time.perf_counter()
+        everything = await database.find_all(collection, {"user_id": "bench-user"}, {"_id": 0, "user_id": 0})
+        print(f"{docs} docs, unpaginated find: {(time.perf_counter() - start) * 1000:.1f}ms, "
+              f"payload {_payload_bytes(everything) / 1024 / 1024:.1f} MiB")
+
+    try:
+        asyncio.run(run())
+    finally:
+        raw.drop()
+        database.close()
+
+
+def _bench_batch(entries, batch_size, latency):
+    """A ``entries``-log sync through the app: one POST /api/logs each vs /api/logs/batch."""
+    # main.py refuses to import without these; the LLM and SMTP are never called here.
+    for name in ("GEMINI_API_KEY", "EMAIL_USER", "EMAIL_PASS"):
+        os.environ.setdefault(name, "bench")
+    os.environ["LLM_BACKEND"] = "fake"
+    import database
+    import main
+    from fastapi.testclient import TestClient
+    from timestamps import utcnow
+
+    logging.getLogger().setLevel(logging.WARNING)
+    for name in ("users_collection", "logs_collection", "log_aggregates_collection"):
+        setattr(main, name, SlowCollection(getattr(main, name), latency))
+    user_id = database.users_collection.insert_one({
+        "username": "bench-sync", "session_id": "bench-sync-session", "session_expiry": utcnow() + timedelta(days=1)
+    }).inserted_id
+    client = TestClient(main.app)
+    client.cookies.set("session_id", "bench-sync-session")
+    start_time = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    logs = [{"mood": "Happy", "sleep": 7.5, "water": 2, "exercise": 30, "note": f"Synced log {i}",
+             "timestamp": (start_time + timedelta(minutes=i)).isoformat()} for i in range(entries)]
+
+    def clean():
+        database.logs_collection.delete_many({"user_id": str(user_id)})
+        database.log_aggregates_collection.delete_many({"user_id": str(user_id)})
+
+    try:
+        clean()
+        start = time.perf_counter()
+        for log in logs:
+            assert client.post("/api/logs", json=log).status_code == 200
+        single = time.perf_counter() - start
+        clean()
+
+        start = time.perf_counter()
+        for offset in range(0, entries, batch_size):
+            response = client.post("/api/logs/batch", json=logs[offset:offset + batch_size])
+            assert response.status_code == 200 and response.json()["failed"] == 0
+        batched = time.perf_counter() - start
+        stored = database.logs_collection.count_documents({"user_id": str(user_id)})
+        print(f"{entries} logs: single-item {single:.2f}s ({entries / single:.0f}/s), "
+              f"batch of {batch_size} {batched:.2f}s ({entries / batched:.0f}/s), {single / batched:.1f}x; stored {stored}")
+    finally:
+        clean()
+        database.users_collection.delete_one({"_id": user_id})
+        database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database benchmarks (run_db executor, pagination, batch ingestion)")
+    parser.add_argument("command", choices=["executor", "pages", "batch"])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100], help="Concurrent clients for executor")
+    parser.add_argument("--requests", type=int, default=50, help="Lookups per client for executor")
+    parser.add_argument("--users", type=int, default=100, help="Seeded accounts for executor (mongomock scans them on every lookup)")
+    parser.add_argument("--docs", type=int, default=100_000, help="Seeded logs for pages")
+    parser.add_argument("--samples", type=int, default=20, help="Pages fetched for pages")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--entries", type=int, default=10_000, help="Logs synced for batch")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--mongomock", action="store_true", help="Use an in-memory mongomock server instead of MONGO_URI")
+    parser.add_argument("--latency-ms", type=float, default=None,
+                        help="Simulated round trip per call (default 2ms with --mongomock, 0 otherwise)")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        use_mongomock()
+    latency = args.latency_ms if args.latency_ms is not None else (2.0 if args.mongomock else 0.0)
+    if args.command == "executor":
+        _bench_executor(args.clients, args.requests, args.users, latency / 1000)
+    elif args.command == "pages":
+        _bench_pages(args.docs, args.samples, args.page_size, latency / 1000)
+    else:
+        _bench_batch(args.entries, args.batch_size, latency / 1000)
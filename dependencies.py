@@ -1,13 +1,14 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from pymongo import MongoClient
 import jwt
 from datetime import datetime, timedelta
 
+from database import get_db
+
 # Example dependency to get session
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def get_session(token: str = Depends(oauth2_scheme)):
+def get_session(token: str = Depends(oauth2_scheme), db=Depends(get_db)):
     try:
         # Decode token (example, adjust based on your JWT setup)
         payload = jwt.decode(token, "your-secret-key", algorithms=["HS256"])
@@ -15,9 +16,7 @@ def get_session(token: str = Depends(oauth2_scheme)):
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        # Connect to MongoDB and fetch session data
-        client = MongoClient("mongodb://localhost:27017/")
-        db = client["healthchain"]
+        # Fetch session data through the shared client
         user = db.users.find_one({"_id": user_id})
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
@@ -0,0 +1,333 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+import smtplib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+from timestamps import utcnow
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_TIMEOUT = int(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_IDLE_TIMEOUT = int(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+EMAIL_USER = os.getenv("EMAIL_USER")
+EMAIL_PASS = os.getenv("EMAIL_PASS")
+
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE = int(os.getenv("EMAIL_RETRY_BASE", "30"))
+EMAIL_RETRY_MAX = int(os.getenv("EMAIL_RETRY_MAX", "3600"))
+EMAIL_POLL_INTERVAL = float(os.getenv("EMAIL_POLL_INTERVAL", "5"))
+# A claimed message whose worker died becomes claimable again after this long.
+EMAIL_LEASE_SECONDS = int(os.getenv("EMAIL_LEASE_SECONDS", "300"))
+
+
+def build_message(sender, to_email, subject, body):
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+
+class PermanentDeliveryError(Exception):
+    """The server rejected this message for good; retrying will not help."""
+
+
+class SMTPUnavailable(Exception):
+    """The server could not be reached or logged in to; no message in the batch can go out."""
+
+
+class SMTPSender:
+    """One persistent, authenticated SMTP connection, reopened when it drops or idles out.
+
+    Not thread-safe: the outbox drives it from a single thread.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, user=EMAIL_USER, password=EMAIL_PASS,
+                 starttls=SMTP_STARTTLS, timeout=SMTP_TIMEOUT, idle_timeout=SMTP_IDLE_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.connections = 0
+        self._server = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        if self.user:
+            server.login(self.user, self.password)
+        self._server = server
+        self.connections += 1
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except OSError:  # includes SMTPException
+                pass
+            self._server = None
+
+    def close_if_idle(self):
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+
+    def send(self, msg):
+        """Send one message, reconnecting once if the connection turns out to be dead."""
+        for attempt in (1, 2):
+            if self._server is None:
+                try:
+                    self._connect()
+                except OSError as e:  # includes SMTPException
+                    raise SMTPUnavailable(f"Cannot connect to {self.host}:{self.port}: {str(e)}") from e
+            try:
+                self._server.send_message(msg)
+                self._last_used = time.monotonic()
+                return
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                code = getattr(e, "smtp_code", None)
+                if isinstance(e, smtplib.SMTPRecipientsRefused):
+                    code = min(c for c, _ in e.recipients.values())
+                if code is not None and 500 <= code < 600:
+                    raise PermanentDeliveryError(str(e))
+                raise
+            except (smtplib.SMTPServerDisconnected, OSError) as e:
+                self._server = None
+                if attempt == 2:
+                    raise SMTPUnavailable(f"Connection to {self.host}:{self.port} lost: {str(e)}") from e
+
+
+class EmailOutbox:
+    """Durable email queue: handlers insert into a Mongo collection, one worker sends.
+
+    Messages move pending -> sending -> sent, or back to pending with exponential backoff
+    until ``max_attempts`` is reached and they are marked failed. Batches are claimed with
+    a token and a lease so several app processes can share one outbox, and the worker's
+    SMTP connection lives on a dedicated thread across batches.
+    """
+
+    def __init__(self, collection, sender=None, sender_address=EMAIL_USER, batch_size=EMAIL_BATCH_SIZE,
+                 max_attempts=EMAIL_MAX_ATTEMPTS, poll_interval=EMAIL_POLL_INTERVAL):
+        self.collection = collection
+        self.sender = sender or SMTPSender()
+        self.sender_address = sender_address
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.counts = {"sent": 0, "retried": 0, "failed": 0}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp")
+        self._wake = None
+        self._task = None
+        self._lock = threading.Lock()
+
+    # --- Producer side ---
+    def enqueue(self, to_email, subject, body):
+        now = utcnow()
+        return self.collection.insert_one({
+            "to": to_email,
+            "subject": subject,
+            "body": body,
+            "status": "pending",
+            "attempts": 0,
+            "created_at": now,
+            "next_attempt_at": now,
+        }).inserted_id
+
+    def notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    # --- Worker side ---
+    def claim_batch(self):
+        now = utcnow()
+        due = {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "lease_until": {"$lte": now}},
+        ]}
+        ids = [doc["_id"] for doc in self.collection.find(due, {"_id": 1}).sort("next_attempt_at", 1).limit(self.batch_size)]
+        if not ids:
+            return []
+        token = uuid.uuid4().hex
+        self.collection.update_many(
+            {"_id": {"$in": ids}, **due},
+            {"$set": {"status": "sending", "claim": token, "lease_until": now + timedelta(seconds=EMAIL_LEASE_SECONDS)}}
+        )
+        return list(self.collection.find({"claim": token, "status": "sending"}))
+
+    def _backoff(self, attempts):
+        delay = min(EMAIL_RETRY_MAX, EMAIL_RETRY_BASE * 2 ** (attempts - 1))
+        return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+    def _settle(self, doc, fields):
+        # Filtered on the claim too: if the lease ran out and another worker re-claimed
+        # the message, its outcome wins and this update matches nothing.
+        return UpdateOne({"_id": doc["_id"], "claim": doc["claim"]}, {"$set": fields, "$unset": {"claim": "", "lease_until": ""}})
+
+    def deliver(self, docs):
+        operations = []
+        for position, doc in enumerate(docs):
+            attempts = doc.get("attempts", 0) + 1
+            try:
+                self.sender.send(build_message(self.sender_address, doc["to"], doc["subject"], doc["body"]))
+            except Exception as e:
+                permanent = isinstance(e, PermanentDeliveryError) or attempts >= self.max_attempts
+                update = {"attempts": attempts, "last_error": str(e)[:500]}
+                if permanent:
+                    update["status"] = "failed"
+                    self._count("failed")
+                    logger.error(f"Email {doc['_id']} to {doc['to']} failed permanently: {str(e)}")
+                else:
+                    update.update(status="pending", next_attempt_at=utcnow() + self._backoff(attempts))
+                    self._count("retried")
+                    logger.warning(f"Email {doc['_id']} to {doc['to']} failed (attempt {attempts}), will retry: {str(e)}")
+                operations.append(self._settle(doc, update))
+                if isinstance(e, SMTPUnavailable):
+                    # Each remaining message would wait out the same connect timeout and the
+                    # batch could outlive its lease, so hand the rest back without an attempt.
+                    remaining = docs[position + 1:]
+                    retry_at = utcnow() + self._backoff(1)
+                    operations.extend(self._settle(other, {"status": "pending", "next_attempt_at": retry_at}) for other in remaining)
+                    if remaining:
+                        logger.warning(f"SMTP unavailable, released {len(remaining)} claimed emails back to the outbox")
+                    break
+                continue
+            self._count("sent")
+            operations.append(self._settle(doc, {"status": "sent", "attempts": attempts, "sent_at": utcnow()}))
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+        return len(docs)
+
+    def run_once(self):
+        docs = self.claim_batch()
+        if not docs:
+            self.sender.close_if_idle()
+            return 0
+        return self.deliver(docs)
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                sent = await loop.run_in_executor(self._executor, self.run_once)
+            except Exception as e:
+                logger.error(f"Email outbox batch failed: {str(e)}", exc_info=True)
+                sent = 0
+            if sent:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.sender.close)
+        self._executor.shutdown(wait=False)
+
+    def status_counts(self):
+        return {doc["_id"]: doc["count"] for doc in self.collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}])}
+
+    def stats(self):
+        with self._lock:
+            return {**self.counts, "smtp_connections": self.sender.connections, "batch_size": self.batch_size}
+
+
+def _bench(messages, batch_size):
+    """SMTP throughput against a local aiosmtpd stand-in; Mongo is not involved."""
+    import socket
+
+    from aiosmtpd.controller import Controller
+
+    class Sink:
+        received = 0
+
+        async def handle_DATA(self, server, session, envelope):
+            Sink.received += 1
+            return "250 OK"
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        host, port = probe.getsockname()
+    logging.getLogger("mail.log").setLevel(logging.WARNING)
+    controller = Controller(Sink(), hostname=host, port=port)
+    controller.start()
+    try:
+        msgs = [build_message("bench@localhost", f"user{i}@localhost", "Benchmark", "Hello") for i in range(messages)]
+
+        sender = SMTPSender(host, port, user=None, starttls=False)
+        start = time.perf_counter()
+        for i in range(0, messages, batch_size):
+            for msg in msgs[i:i + batch_size]:
+                sender.send(msg)
+        sender.close()
+        pooled = time.perf_counter() - start
+
+        sample = min(messages, 1000)
+        start = time.perf_counter()
+        for msg in msgs[:sample]:
+            fresh = SMTPSender(host, port, user=None, starttls=False)
+            fresh.send(msg)
+            fresh.close()
+        per_message = (time.perf_counter() - start) * messages / sample
+
+        print(f"{messages} messages: persistent connection {pooled:.2f}s ({messages / pooled:.0f} msg/s, "
+              f"{sender.connections} connection), connection per message ~{per_message:.2f}s "
+              f"(extrapolated from {sample}); server received {Sink.received}")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Email outbox tools")
+    parser.add_argument("command", choices=["status", "drain", "bench"])
+    parser.add_argument("--messages", type=int, default=10_000, help="Messages for bench")
+    parser.add_argument("--batch-size", type=int, default=EMAIL_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        _bench(args.messages, args.batch_size)
+    else:
+        from database import email_outbox_collection
+        outbox = EmailOutbox(email_outbox_collection, batch_size=args.batch_size)
+        if args.command == "status":
+            print(outbox.status_counts())
+        else:
+            while outbox.run_once():
+                pass
+            outbox.sender.close()
+            print(outbox.stats())
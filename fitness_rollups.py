@@ -0,0 +1,142 @@
+import argparse
+import logging
+import math
+import sys
+
+from pymongo import ReplaceOne, UpdateOne
+
+from calories import estimate_one
+from log_aggregates import week_key
+
+logger = logging.getLogger(__name__)
+
+REBUILD_BATCH_SIZE = 1000
+
+ROLLUP_FIELDS = ("total_duration", "total_intensity", "total_weighted_calories", "count")
+
+
+def weighted_calories(entry):
+    """MET x minutes x kg (kcal x 60), the unit the rollups have always stored."""
+    return 60 * estimate_one(entry.get("exercise_name"), entry.get("duration"), entry.get("weight"), entry.get("intensity"))
+
+
+def rollup_id(user_id, week):
+    return f"{user_id}:{week}"
+
+
+def _increments(entry):
+    return {
+        "total_duration": entry.get("duration") or 0,
+        "total_intensity": entry.get("intensity") or 0,
+        "total_weighted_calories": weighted_calories(entry),
+        "count": 1,
+    }
+
+
+def rollup_update_operation(user_id, entry):
+    """Upsert that folds one fitness entry into its ISO-week rollup document."""
+    week = week_key(entry.get("timestamp"))
+    return UpdateOne(
+        {"_id": rollup_id(user_id, week)},
+        {"$setOnInsert": {"user_id": user_id, "week": week}, "$inc": _increments(entry)},
+        upsert=True
+    )
+
+
+def apply_entries(collection, user_id, entries):
+    operations = [rollup_update_operation(user_id, entry) for entry in entries]
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+
+def recent_weeks(collection, user_id, count=4):
+    """Newest ``count`` rollups for a user, most recent week first."""
+    return list(collection.find({"user_id": user_id}, {"_id": 0, "user_id": 0}).sort("week", -1).limit(count))
+
+
+def _fold(rollups, user_id, entry):
+    week = week_key(entry.get("timestamp"))
+    doc = rollups.get(week)
+    if doc is None:
+        doc = rollups[week] = {"_id": rollup_id(user_id, week), "user_id": user_id, "week": week, **dict.fromkeys(ROLLUP_FIELDS, 0)}
+    for field, value in _increments(entry).items():
+        doc[field] += value
+
+
+def _raw_entries(fitness_collection, query):
+    projection = {"_id": 0, "user_id": 1, "timestamp": 1, "exercise_name": 1, "duration": 1, "intensity": 1, "weight": 1}
+    return fitness_collection.find(query, projection).sort("user_id", 1).batch_size(REBUILD_BATCH_SIZE)
+
+
+def _scan(fitness_collection, query):
+    """Yield ``(user_id, {week: rollup})`` per user from raw entries, one user in memory at a time."""
+    current_user, rollups = None, {}
+    for entry in _raw_entries(fitness_collection, query):
+        user_id = entry.get("user_id")
+        if user_id != current_user:
+            if rollups:
+                yield current_user, rollups
+            current_user, rollups = user_id, {}
+        try:
+            _fold(rollups, user_id, entry)
+        except ValueError:
+            logger.warning(f"Skipping fitness entry with unparseable timestamp for user {user_id}: {entry.get('timestamp')}")
+    if rollups:
+        yield current_user, rollups
+
+
+def rebuild(fitness_collection, rollup_collection, user_id=None):
+    """Recompute rollups from raw fitness entries (all users, or one)."""
+    query = {"user_id": user_id} if user_id else {}
+    rollup_collection.delete_many(query)
+    users = written = 0
+    for user, rollups in _scan(fitness_collection, query):
+        rollup_collection.bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in rollups.values()], ordered=False)
+        users += 1
+        written += len(rollups)
+    logger.info(f"Rebuild complete: {written} weekly rollups for {users} users")
+    return users, written
+
+
+def _matches(expected, actual):
+    return all(math.isclose(expected.get(field, 0), actual.get(field, 0), rel_tol=1e-9, abs_tol=1e-6) for field in ROLLUP_FIELDS)
+
+
+def check(fitness_collection, rollup_collection, user_id=None):
+    """Compare stored rollups with a fresh fold of the raw entries.
+
+    Returns a list of ``{"user_id", "week", "expected", "actual"}`` mismatches; a
+    missing rollup or a rollup with no raw entries behind it shows up as None.
+    """
+    query = {"user_id": user_id} if user_id else {}
+    expected = {(user, week): doc for user, rollups in _scan(fitness_collection, query) for week, doc in rollups.items()}
+    actual = {(doc["user_id"], doc["week"]): doc for doc in rollup_collection.find(query)}
+    mismatches = []
+    for key in sorted(expected.keys() | actual.keys(), key=lambda k: (str(k[0]), k[1])):
+        want, have = expected.get(key), actual.get(key)
+        if want is None or have is None or not _matches(want, have):
+            mismatches.append({
+                "user_id": key[0],
+                "week": key[1],
+                "expected": {field: want[field] for field in ROLLUP_FIELDS} if want else None,
+                "actual": {field: have.get(field) for field in ROLLUP_FIELDS} if have else None,
+            })
+    logger.info(f"Consistency check: {len(expected)} expected rollups, {len(actual)} stored, {len(mismatches)} mismatches")
+    return mismatches
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Maintain weekly fitness rollups")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--user", help="Limit to one user_id")
+    args = parser.parse_args()
+
+    from database import fitness_collection, fitness_weekly_collection
+    if args.command == "rebuild":
+        rebuild(fitness_collection, fitness_weekly_collection, args.user)
+    else:
+        mismatches = check(fitness_collection, fitness_weekly_collection, args.user)
+        for mismatch in mismatches:
+            logger.warning(f"Mismatch: {mismatch}")
+        sys.exit(1 if mismatches else 0)
@@ -0,0 +1,207 @@
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, DESCENDING
+
+from nutrition_cache import NUTRITION_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+# --- Index Specs ---
+# (collection name, keys, options). Every query issued by main.py should be served by
+# one of these; CANONICAL_QUERIES below is what /api/debug/indexes checks against them.
+INDEX_SPECS = [
+    ("users", [("session_id", ASCENDING)], {}),
+    ("users", [("username", ASCENDING)], {}),
+    ("doctors", [("session_id", ASCENDING)], {}),
+    ("doctors", [("email", ASCENDING)], {}),
+    ("health_logs", [("user_id", ASCENDING), ("_id", DESCENDING)], {}),
+    ("health_logs", [("user_id", ASCENDING), ("timestamp", ASCENDING)], {}),
+    ("health_log_aggregates", [("user_id", ASCENDING), ("period", ASCENDING), ("key", ASCENDING)], {}),
+    ("nutrition", [("user_id", ASCENDING), ("timestamp", ASCENDING)], {}),
+    ("nutrition", [("user_id", ASCENDING), ("_id", DESCENDING)], {}),
+    ("fitness", [("user_id", ASCENDING), ("timestamp", ASCENDING)], {}),
+    ("fitness", [("user_id", ASCENDING), ("_id", DESCENDING)], {}),
+    ("fitness_weekly", [("user_id", ASCENDING), ("week", DESCENDING)], {}),
+    ("medications", [("user_id", ASCENDING), ("_id", DESCENDING)], {}),
+    ("reports", [("user_id", ASCENDING), ("_id", DESCENDING)], {}),
+    ("ledger", [("user_id", ASCENDING), ("index", ASCENDING)], {"unique": True}),
+    ("ledger_ranges", [("user_id", ASCENDING), ("range", ASCENDING)], {}),
+    ("appointments", [("doctor_id", ASCENDING), ("status", ASCENDING), ("accepted_at", ASCENDING)], {}),
+    ("email_outbox", [("status", ASCENDING), ("next_attempt_at", ASCENDING)], {}),
+    ("email_outbox", [("claim", ASCENDING)], {"sparse": True}),
+    ("nutrition_cache", [("created_at", ASCENDING)], {"expireAfterSeconds": NUTRITION_CACHE_TTL}),
+]
+
+# (name, collection name, filter, sort) with placeholder values; only the plan shape matters.
+CANONICAL_QUERIES = [
+    ("session lookup", "users", {"session_id": "x"}, None),
+    ("login", "users", {"username": "x", "password": "x"}, None),
+    ("doctor session lookup", "doctors", {"session_id": "x"}, None),
+    ("doctor login", "doctors", {"email": "x", "password": "x"}, None),
+    ("logs page", "health_logs", {"user_id": "x"}, [("_id", DESCENDING)]),
+    ("report logs", "health_logs", {"user_id": "x"}, [("timestamp", ASCENDING)]),
+    ("logs summary", "health_log_aggregates", {"user_id": "x", "period": "day", "key": {"$gte": "x"}}, [("key", ASCENDING)]),
+    ("today's nutrition", "nutrition", {"user_id": "x", "timestamp": {"$gte": "x"}}, None),
+    ("nutrition page", "nutrition", {"user_id": "x"}, [("_id", DESCENDING)]),
+    ("nutrition export", "nutrition", {"user_id": "x"}, [("_id", ASCENDING)]),
+    ("latest fitness", "fitness", {"user_id": "x"}, [("timestamp", DESCENDING)]),
+    ("fitness page", "fitness", {"user_id": "x"}, [("_id", DESCENDING)]),
+    ("fitness progress", "fitness_weekly", {"user_id": "x"}, [("week", DESCENDING)]),
+    ("meds page", "medications", {"user_id": "x"}, [("_id", DESCENDING)]),
+    ("reports page", "reports", {"user_id": "x"}, [("_id", DESCENDING)]),
+    ("ledger tip", "ledger", {"user_id": "x"}, [("index", DESCENDING)]),
+    ("ledger ranges", "ledger_ranges", {"user_id": "x"}, None),
+    ("ledger suffix", "ledger", {"user_id": "x", "index": {"$gt": 0}}, [("index", ASCENDING)]),
+    ("email outbox due", "email_outbox", {"status": "pending", "next_attempt_at": {"$lte": "x"}}, [("next_attempt_at", ASCENDING)]),
+    ("pending appointments", "appointments", {"doctor_id": "x", "status": "pending"}, None),
+    ("accepted appointments", "appointments", {"doctor_id": "x", "status": "accepted"}, [("accepted_at", ASCENDING)]),
+]
+
+
+def _index_name(keys):
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+def ensure_indexes(db):
+    """Create any missing index from INDEX_SPECS; create_index is a no-op for existing ones."""
+    created = []
+    for collection_name, keys, options in INDEX_SPECS:
+        collection = db[collection_name]
+        name = _index_name(keys)
+        if name in collection.index_information():
+            continue
+        collection.create_index(keys, name=name, background=True, **options)
+        created.append(f"{collection_name}.{name}")
+    if created:
+        logger.info(f"Created indexes: {', '.join(created)}")
+    return created
+
+
+def missing_indexes(db):
+    missing = []
+    for collection_name, keys, _ in INDEX_SPECS:
+        name = _index_name(keys)
+        if name not in db[collection_name].index_information():
+            missing.append(f"{collection_name}.{name}")
+    return missing
+
+
+def _plan_stages(plan):
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+def _plan_indexes(plan):
+    names = []
+    if isinstance(plan, dict):
+        if "indexName" in plan:
+            names.append(plan["indexName"])
+        for value in plan.values():
+            names.extend(_plan_indexes(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            names.extend(_plan_indexes(item))
+    return names
+
+
+def explain_canonical_queries(db):
+    results = []
+    for name, collection_name, query, sort in CANONICAL_QUERIES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning_plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        stages = _plan_stages(winning_plan)
+        results.append({
+            "query": name,
+            "collection": collection_name,
+            "stages": stages,
+            "indexes": _plan_indexes(winning_plan),
+            "collscan": "COLLSCAN" in stages,
+        })
+    return results
+
+
+def _bench_doc(i, users, start):
+    # Every field a canonical query filters on. Owner "x" (the placeholder value) gets
+    # 1/users of the rows, so the queries match real data instead of nothing.
+    owner = "x" if i % users == 0 else f"user{i % users}"
+    unique = "x" if i == 0 else f"{i}"
+    timestamp = start + timedelta(minutes=i)
+    return {
+        "user_id": owner, "doctor_id": owner,
+        "session_id": unique, "username": unique, "email": unique, "password": "x",
+        "status": ("pending", "accepted", "sent")[i % 3],
+        "timestamp": timestamp, "accepted_at": timestamp, "next_attempt_at": timestamp, "created_at": timestamp,
+        "period": "day", "key": timestamp.strftime("%Y-%m-%d"), "week": timestamp.strftime("%G-W%V"),
+        "index": i // users, "range": i // users,
+    }
+
+
+def _time_query(collection, query, sort, repeat, limit):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor = collection.find(query).limit(limit)
+        if sort:
+            cursor = cursor.sort(sort)
+        list(cursor)
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2]
+
+
+def _bench(db, docs, users, repeat, limit, only=None):
+    """Canonical query latency on ``docs`` rows per collection, before and after ensure_indexes."""
+    names = sorted({collection for _, collection, _, _ in CANONICAL_QUERIES if not only or collection in only})
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    for name in names:
+        collection = db[name]
+        collection.drop()
+        seeded = time.perf_counter()
+        for offset in range(0, docs, 10_000):
+            collection.insert_many([_bench_doc(i, users, start) for i in range(offset, min(offset + 10_000, docs))], ordered=False)
+        print(f"seeded {name}: {docs} docs in {time.perf_counter() - seeded:.1f}s")
+
+    queries = [q for q in CANONICAL_QUERIES if q[1] in names]
+    before = {q[0]: (_time_query(db[q[1]], q[2], q[3], repeat, limit), q) for q in queries}
+    plans_before = {plan["query"]: plan for plan in explain_canonical_queries(db) if plan["collection"] in names}
+    built = time.perf_counter()
+    ensure_indexes(db)
+    print(f"ensure_indexes: {time.perf_counter() - built:.1f}s")
+    plans_after = {plan["query"]: plan for plan in explain_canonical_queries(db) if plan["collection"] in names}
+
+    for name, (seconds, (_, collection_name, query, sort)) in before.items():
+        after = _time_query(db[collection_name], query, sort, repeat, limit)
+        print(f"{name:>24}: {seconds * 1000:9.2f}ms -> {after * 1000:7.2f}ms  "
+              f"{'>'.join(plans_before[name]['stages'])} -> {'>'.join(plans_after[name]['stages'])}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="MongoDB index tools")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--docs", type=int, default=1_000_000, help="Rows seeded into each collection")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per query; the median is reported")
+    parser.add_argument("--limit", type=int, default=51, help="Rows read per query, like one page")
+    parser.add_argument("--only", nargs="+", help="Limit to these collections")
+    args = parser.parse_args()
+
+    from database import MONGO_DB_NAME, client
+    # A scratch database: the bench drops collections and builds indexes freely.
+    bench_db = client[f"{MONGO_DB_NAME}_index_bench"]
+    try:
+        _bench(bench_db, args.docs, args.users, args.repeat, args.limit, args.only)
+    finally:
+        client.drop_database(bench_db.name)
@@ -0,0 +1,424 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from pymongo.errors import DuplicateKeyError
+
+from merkle import merkle_proof, merkle_root, verify_proof
+from timestamps import parse_timestamp, utcnow
+
+logger = logging.getLogger(__name__)
+
+LEDGER_APPEND_RETRIES = int(os.getenv("LEDGER_APPEND_RETRIES", "5"))
+LEDGER_VALIDATE_BATCH_SIZE = 1000
+# Blocks per Merkle checkpoint range; range r covers indices r*span+1 .. (r+1)*span.
+LEDGER_CHECKPOINT_SPAN = int(os.getenv("LEDGER_CHECKPOINT_SPAN", "1024"))
+LEDGER_VERIFY_PROCESSES = int(os.getenv("LEDGER_VERIFY_PROCESSES", str(os.cpu_count() or 1)))
+# Full validations that may run at once; each holds one thread for the whole chain.
+LEDGER_FULL_VALIDATIONS = int(os.getenv("LEDGER_FULL_VALIDATIONS", "2"))
+
+# Same genesis block as static/blocks/blockchain.js; every user's chain starts from it.
+GENESIS_INDEX = 0
+GENESIS_TIMESTAMP = "2025-04-15T00:00:00Z"
+GENESIS_DATA = "Genesis Block"
+GENESIS_PREVIOUS_HASH = "0"
+
+
+class LedgerConflict(Exception):
+    """Raised when an append keeps losing the race for the next index."""
+
+
+def _js_value(value):
+    # JSON.stringify prints integral numbers without a fractional part.
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, dict):
+        return {key: _js_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_js_value(item) for item in value]
+    return value
+
+
+def js_stringify(value):
+    """JSON text matching JavaScript's JSON.stringify for plain JSON data."""
+    return json.dumps(_js_value(value), separators=(",", ":"), ensure_ascii=False)
+
+
+def calculate_hash(index, previous_hash, data, timestamp):
+    """Block.calculateHash(): SHA256(index + previousHash + JSON.stringify(data) + timestamp)."""
+    payload = f"{index}{previous_hash}{js_stringify(data)}{timestamp}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def js_timestamp(value=None):
+    """Date.prototype.toISOString() format, e.g. 2025-04-15T00:00:00.000Z."""
+    return (value or utcnow()).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+GENESIS_HASH = calculate_hash(GENESIS_INDEX, GENESIS_PREVIOUS_HASH, GENESIS_DATA, GENESIS_TIMESTAMP)
+GENESIS_BLOCK = {
+    "index": GENESIS_INDEX,
+    "timestamp": GENESIS_TIMESTAMP,
+    "data": GENESIS_DATA,
+    "previousHash": GENESIS_PREVIOUS_HASH,
+    "hash": GENESIS_HASH,
+}
+
+BLOCK_PROJECTION = {"_id": 0, "user_id": 0}
+HASH_INPUT_PROJECTION = {"_id": 0, "index": 1, "timestamp": 1, "data": 1, "previousHash": 1, "hash": 1}
+
+
+def block_is_consistent(block, previous):
+    return (
+        block["index"] == previous["index"] + 1
+        and block["previousHash"] == previous["hash"]
+        and block["hash"] == calculate_hash(block["index"], block["previousHash"], block["data"], block["timestamp"])
+    )
+
+
+def range_of(index, span=LEDGER_CHECKPOINT_SPAN):
+    return (index - 1) // span
+
+
+def range_bounds(range_number, span=LEDGER_CHECKPOINT_SPAN):
+    return range_number * span + 1, (range_number + 1) * span
+
+
+def verify_range(blocks, previous, expected_root=None):
+    """Re-link and re-hash one contiguous run of blocks; runs in a worker process.
+
+    ``previous`` is ``{"index", "hash"}`` of the block before the run. When the run is
+    a sealed range, its Merkle root must also match ``expected_root``.
+    """
+    start = previous["index"] + 1
+    for block in blocks:
+        if not block_is_consistent(block, previous):
+            return {"start": start, "valid": False, "invalid_index": block["index"], "checked": block["index"] - start}
+        previous = block
+    if expected_root and blocks and merkle_root([block["hash"] for block in blocks]) != expected_root:
+        return {"start": start, "valid": False, "invalid_index": None, "checked": len(blocks), "error": "Merkle root mismatch"}
+    return {"start": start, "valid": True, "checked": len(blocks), "last": {"index": previous["index"], "hash": previous["hash"]}}
+
+
+_executor = None
+_validation_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=LEDGER_VERIFY_PROCESSES)
+    return _executor
+
+
+def get_validation_executor():
+    """Threads that drive verify_parallel, kept apart from the database executor.
+
+    A full validation waits on the process pool for the whole chain; on the shared
+    executor a few of them would leave no threads for ordinary queries. Extra requests
+    queue here instead.
+    """
+    global _validation_executor
+    if _validation_executor is None:
+        _validation_executor = ThreadPoolExecutor(max_workers=LEDGER_FULL_VALIDATIONS, thread_name_prefix="ledger-verify")
+    return _validation_executor
+
+
+def shutdown():
+    global _executor, _validation_executor
+    if _validation_executor is not None:
+        _validation_executor.shutdown(wait=False, cancel_futures=True)
+        _validation_executor = None
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+class Ledger:
+    """Per-user append-only hash chain stored one block per document.
+
+    The genesis block is implicit. The unique (user_id, index) index makes an append
+    a conditional insert: only one block can claim ``tip.index + 1`` and it must
+    carry ``tip.hash`` as its previousHash, so concurrent appends cannot fork a chain.
+    Appends and validation touch the tip and the unverified suffix only.
+    """
+
+    def __init__(self, blocks, checkpoints, ranges, meta=None, span=LEDGER_CHECKPOINT_SPAN):
+        self.blocks = blocks
+        self.checkpoints = checkpoints
+        self.ranges = ranges
+        self.meta = meta
+        self.span = span
+
+    def tip(self, user_id):
+        block = self.blocks.find_one({"user_id": user_id}, BLOCK_PROJECTION, sort=[("index", -1)])
+        return block or GENESIS_BLOCK
+
+    def append(self, user_id, data, **extra):
+        """Append ``data`` as the user's next block and return it.
+
+        ``extra`` fields are stored alongside the block but are not part of its hash.
+        """
+        for _ in range(LEDGER_APPEND_RETRIES):
+            tip = self.tip(user_id)
+            index, timestamp = tip["index"] + 1, js_timestamp()
+            block = {
+                "index": index,
+                "timestamp": timestamp,
+                "data": data,
+                "previousHash": tip["hash"],
+                "hash": calculate_hash(index, tip["hash"], data, timestamp),
+            }
+            try:
+                self.blocks.insert_one({"user_id": user_id, **block, **extra})
+            except DuplicateKeyError:
+                logger.info(f"Ledger append raced for user {user_id} at index {index}, retrying")
+                continue
+            self._record_head(user_id, block)
+            if index % self.span == 0:
+                try:
+                    self.seal_range(user_id, range_of(index, self.span))
+                except Exception as e:
+                    # The block is stored; an unsealed range is sealed later by seal_missing().
+                    logger.warning(f"Failed to seal ledger range ending at {index} for user {user_id}: {str(e)}")
+            return block
+        raise LedgerConflict(f"Could not append to ledger for user {user_id} after {LEDGER_APPEND_RETRIES} attempts")
+
+    def chain(self, user_id, after_index=GENESIS_INDEX, limit=None):
+        cursor = self.blocks.find(
+            {"user_id": user_id, "index": {"$gt": after_index}}, BLOCK_PROJECTION
+        ).sort("index", 1).batch_size(LEDGER_VALIDATE_BATCH_SIZE)
+        if limit:
+            cursor = cursor.limit(limit)
+        return cursor
+
+    # --- Chain Metadata ---
+    def _record_head(self, user_id, block):
+        if self.meta is None:
+            return
+        try:
+            # Only move the head forward; a slower writer of an older block matches
+            # nothing, and its upsert then collides on _id and is dropped. A document
+            # created by _record_verified() has no head yet and must still match.
+            self.meta.update_one(
+                {"_id": user_id, "$or": [{"head_index": {"$lt": block["index"]}}, {"head_index": {"$exists": False}}]},
+                {"$set": {"head_index": block["index"], "head_hash": block["hash"], "last_append": parse_timestamp(block["timestamp"])}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            pass
+
+    def _record_verified(self, user_id, block):
+        verified = {"index": block["index"], "hash": block["hash"], "verified_at": utcnow()}
+        self.checkpoints.update_one({"_id": user_id}, {"$set": verified}, upsert=True)
+        if self.meta is not None:
+            self.meta.update_one({"_id": user_id}, {"$set": {"last_verified": verified}}, upsert=True)
+
+    def status(self, user_id):
+        """Chain head and last verified checkpoint from the metadata document.
+
+        Chains written before metadata existed are read from their tip once and the
+        document is created then.
+        """
+        doc = self.meta.find_one({"_id": user_id}) if self.meta is not None else None
+        if not doc or "head_index" not in doc:
+            tip = self.tip(user_id)
+            if tip["index"]:
+                self._record_head(user_id, tip)
+            last_append = parse_timestamp(tip["timestamp"]) if tip["index"] else None
+            doc = {**(doc or {}), "head_index": tip["index"], "head_hash": tip["hash"], "last_append": last_append}
+        return {
+            "length": doc["head_index"] + 1,
+            "head_index": doc["head_index"],
+            "head_hash": doc["head_hash"],
+            "last_append": doc.get("last_append"),
+            "last_verified": doc.get("last_verified"),
+        }
+
+    def checkpoint(self, user_id):
+        doc = self.checkpoints.find_one({"_id": user_id})
+        if not doc:
+            return {"index": GENESIS_BLOCK["index"], "hash": GENESIS_BLOCK["hash"]}
+        return {"index": doc["index"], "hash": doc["hash"]}
+
+    def validate(self, user_id, full=False):
+        """isChainValid() over the blocks after the last checkpoint (or all, with ``full``).
+
+        A fully valid run moves the checkpoint to the current tip, so the next call
+        only re-hashes blocks appended since.
+        """
+        start = {"index": GENESIS_BLOCK["index"], "hash": GENESIS_BLOCK["hash"]} if full else self.checkpoint(user_id)
+        previous, checked = start, 0
+        for block in self.chain(user_id, after_index=start["index"]):
+            if not block_is_consistent(block, previous):
+                logger.warning(f"Ledger for user {user_id} is invalid at block {block['index']}")
+                return {"valid": False, "verified_from": start["index"], "invalid_index": block["index"], "checked": checked}
+            previous = block
+            checked += 1
+        if previous["index"] > start["index"]:
+            self._record_verified(user_id, previous)
+        return {"valid": True, "verified_from": start["index"], "verified_to": previous["index"], "checked": checked}
+
+    # --- Merkle Checkpoints ---
+    def _range_blocks(self, user_id, range_number, projection=HASH_INPUT_PROJECTION):
+        start, end = range_bounds(range_number, self.span)
+        return list(self.blocks.find(
+            {"user_id": user_id, "index": {"$gte": start, "$lte": end}}, projection
+        ).sort("index", 1).batch_size(LEDGER_VALIDATE_BATCH_SIZE))
+
+    def seal_range(self, user_id, range_number):
+        """Store the Merkle root over one complete range of blocks."""
+        start, end = range_bounds(range_number, self.span)
+        hashes = [block["hash"] for block in self._range_blocks(user_id, range_number, {"_id": 0, "hash": 1})]
+        if len(hashes) != self.span:
+            raise ValueError(f"Range {start}-{end} has {len(hashes)} of {self.span} blocks")
+        doc = {
+            "_id": f"{user_id}:{range_number}",
+            "user_id": user_id,
+            "range": range_number,
+            "start": start,
+            "end": end,
+            "root": merkle_root(hashes),
+            "last_hash": hashes[-1],
+            "sealed_at": utcnow(),
+        }
+        self.ranges.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+        return doc
+
+    def seal_missing(self, user_id=None):
+        """Seal every complete range that has no checkpoint yet (all users, or one)."""
+        users = [user_id] if user_id else self.blocks.distinct("user_id")
+        sealed = 0
+        for user in users:
+            complete = range_of(self.tip(user)["index"] + 1, self.span)
+            existing = {doc["range"] for doc in self.ranges.find({"user_id": user}, {"range": 1})}
+            for range_number in range(complete):
+                if range_number not in existing:
+                    self.seal_range(user, range_number)
+                    sealed += 1
+        logger.info(f"Sealed {sealed} ledger ranges")
+        return sealed
+
+    def proof(self, user_id, index):
+        """Inclusion proof for one block against its range's Merkle root.
+
+        Blocks in the open (not yet full) range are proved against a root computed on
+        the fly, reported with ``"sealed": False``. Returns None for unknown blocks.
+        """
+        block = self.blocks.find_one({"user_id": user_id, "index": index}, BLOCK_PROJECTION)
+        if not block:
+            return None
+        block.pop("client_hash", None)
+        range_number = range_of(index, self.span)
+        start, end = range_bounds(range_number, self.span)
+        hashes = [b["hash"] for b in self._range_blocks(user_id, range_number, {"_id": 0, "hash": 1})]
+        sealed = self.ranges.find_one({"_id": f"{user_id}:{range_number}"}, {"root": 1})
+        root = sealed["root"] if sealed else merkle_root(hashes)
+        return {
+            "block": block,
+            "block_valid": block["hash"] == calculate_hash(block["index"], block["previousHash"], block["data"], block["timestamp"]),
+            "range": {"number": range_number, "start": start, "end": end, "sealed": bool(sealed)},
+            "root": root,
+            "proof": merkle_proof(hashes, index - start),
+        }
+
+    def verify_parallel(self, user_id):
+        """Full-chain isChainValid() with each checkpoint range verified in a worker process.
+
+        The parent streams one range at a time from Mongo and keeps at most
+        2 x LEDGER_VERIFY_PROCESSES ranges in flight. Range links are checked by handing
+        each worker the last hash of the range before it, taken from its checkpoint.
+        """
+        tip = self.tip(user_id)
+        roots = {doc["range"]: doc for doc in self.ranges.find({"user_id": user_id}, {"range": 1, "root": 1})}
+        executor, pending, results = get_executor(), [], []
+        previous = {"index": GENESIS_BLOCK["index"], "hash": GENESIS_BLOCK["hash"]}
+        for range_number in range(range_of(tip["index"], self.span) + 1 if tip["index"] else 0):
+            blocks = self._range_blocks(user_id, range_number)
+            sealed = roots.get(range_number)
+            pending.append(executor.submit(verify_range, blocks, previous, sealed["root"] if sealed else None))
+            # The worker for the next range checks its first link against this range's
+            # last stored block; a gap or tampering inside this range fails this worker.
+            previous = {"index": range_bounds(range_number, self.span)[1], "hash": blocks[-1]["hash"] if blocks else previous["hash"]}
+            if len(pending) >= 2 * LEDGER_VERIFY_PROCESSES:
+                results.append(pending.pop(0).result())
+        results.extend(future.result() for future in pending)
+
+        checked = sum(result["checked"] for result in results)
+        failed = next((result for result in results if not result["valid"]), None)
+        if failed:
+            logger.warning(f"Ledger for user {user_id} failed parallel verification at {failed}")
+            return {"valid": False, "verified_from": GENESIS_BLOCK["index"], "invalid_index": failed.get("invalid_index"),
+                    "range_start": failed["start"], "error": failed.get("error"), "checked": checked}
+        if tip["index"]:
+            self._record_verified(user_id, tip)
+        return {"valid": True, "verified_from": GENESIS_BLOCK["index"], "verified_to": tip["index"], "checked": checked, "ranges": len(results)}
+
+
+def _synthetic_chain(count):
+    previous, blocks = GENESIS_BLOCK, []
+    for index in range(1, count + 1):
+        data = {"type": "log", "data": {"mood": "Happy", "sleep": 7.5, "water": 2, "exercise": 30}, "timestamp": "2025-04-15T00:00:00.000Z"}
+        timestamp = "2025-04-15T00:00:00.000Z"
+        block = {"index": index, "timestamp": timestamp, "data": data, "previousHash": previous["hash"],
+                 "hash": calculate_hash(index, previous["hash"], data, timestamp)}
+        blocks.append(block)
+        previous = block
+    return blocks
+
+
+def _bench(count, span=LEDGER_CHECKPOINT_SPAN):
+    """CPU-side costs at ``count`` blocks; Mongo I/O is not included."""
+    start = time.perf_counter()
+    blocks = _synthetic_chain(count)
+    print(f"build {count} blocks: {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    serial = verify_range(blocks, GENESIS_BLOCK)
+    print(f"serial isChainValid: {time.perf_counter() - start:.2f}s (valid={serial['valid']})")
+
+    start = time.perf_counter()
+    ranges = [blocks[i:i + span] for i in range(0, count, span)]
+    roots = [merkle_root([block["hash"] for block in chunk]) for chunk in ranges]
+    print(f"seal {len(ranges)} ranges of {span}: {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    previous = [GENESIS_BLOCK] + [chunk[-1] for chunk in ranges[:-1]]
+    with ProcessPoolExecutor(max_workers=LEDGER_VERIFY_PROCESSES) as executor:
+        results = list(executor.map(verify_range, ranges, [{"index": p["index"], "hash": p["hash"]} for p in previous], roots, chunksize=8))
+    print(f"parallel verify on {LEDGER_VERIFY_PROCESSES} processes: {time.perf_counter() - start:.2f}s "
+          f"(valid={all(result['valid'] for result in results)})")
+
+    target = count // 2 + 1
+    chunk = ranges[range_of(target, span)]
+    hashes = [block["hash"] for block in chunk]
+    start = time.perf_counter()
+    proof = merkle_proof(hashes, target - range_bounds(range_of(target, span), span)[0])
+    valid = verify_proof(blocks[target - 1]["hash"], proof, roots[range_of(target, span)])
+    print(f"proof for block {target}: {len(proof)} hashes, {(time.perf_counter() - start) * 1000:.2f}ms (valid={valid})")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Maintain and verify per-user ledgers")
+    parser.add_argument("command", choices=["seal", "verify", "bench"])
+    parser.add_argument("--user", help="Limit to one user_id (required for verify)")
+    parser.add_argument("--blocks", type=int, default=1_000_000, help="Chain length for bench")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        _bench(args.blocks)
+    else:
+        from database import ledger_collection, ledger_checkpoints_collection, ledger_ranges_collection
+        ledger = Ledger(ledger_collection, ledger_checkpoints_collection, ledger_ranges_collection)
+        if args.command == "seal":
+            ledger.seal_missing(args.user)
+        elif not args.user:
+            parser.error("verify needs --user")
+        else:
+            print(ledger.verify_parallel(args.user))
+            shutdown()
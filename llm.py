@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left
+
+import google.generativeai as genai
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram with fixed bucket bounds (seconds)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def snapshot(self):
+        labels = [f"le_{b}" for b in self.buckets] + ["le_inf"]
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "mean_seconds": round(self.total / self.count, 4) if self.count else 0.0,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class GeminiBackend:
+    """Calls Gemini through the async API, reusing one GenerativeModel per model name."""
+
+    def __init__(self):
+        self._models = {}
+
+    def model(self, model_name):
+        model = self._models.get(model_name)
+        if model is None:
+            model = self._models[model_name] = genai.GenerativeModel(model_name)
+        return model
+
+    async def generate(self, model_name, contents, **kwargs):
+        response = await self.model(model_name).generate_content_async(contents, **kwargs)
+        return response.text
+
+
+class FakeBackend:
+    """Local stand-in for tests and benchmarks.
+
+    ``responder(model_name, contents, **kwargs)`` builds the reply; without one, ``text``
+    is returned. ``latency`` simulates network time without blocking the event loop.
+    """
+
+    def __init__(self, responder=None, text="", latency=0.0):
+        self.responder = responder
+        self.text = text
+        self.latency = latency
+
+    async def generate(self, model_name, contents, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.responder:
+            return self.responder(model_name, contents, **kwargs)
+        return self.text
+
+
+class LLMClient:
+    """Shared entry point for all LLM calls.
+
+    Each model gets its own semaphore so a burst against one model cannot starve the
+    others, and every call is bounded by a deadline that includes time spent queued.
+    """
+
+    def __init__(self, backend, max_concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_TIMEOUT, limits=None):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.limits = limits or {}
+        self._semaphores = {}
+        self._histograms = {}
+
+    def use_backend(self, backend):
+        self.backend = backend
+
+    def _semaphore(self, model_name):
+        semaphore = self._semaphores.get(model_name)
+        if semaphore is None:
+            limit = self.limits.get(model_name, self.max_concurrency)
+            semaphore = self._semaphores[model_name] = asyncio.Semaphore(limit)
+        return semaphore
+
+    def _histogram(self, model_name):
+        histogram = self._histograms.get(model_name)
+        if histogram is None:
+            histogram = self._histograms[model_name] = LatencyHistogram()
+        return histogram
+
+    async def _call(self, model_name, contents, **kwargs):
+        async with self._semaphore(model_name):
+            return await self.backend.generate(model_name, contents, **kwargs)
+
+    async def generate(self, model_name, contents, timeout=None, **kwargs):
+        histogram = self._histogram(model_name)
+        start = time.perf_counter()
+        try:
+            text = await asyncio.wait_for(self._call(model_name, contents, **kwargs), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            histogram.timeouts += 1
+            logger.error(f"LLM call to {model_name} exceeded {timeout or self.timeout}s deadline")
+            raise
+        except Exception:
+            histogram.errors += 1
+            raise
+        histogram.observe(time.perf_counter() - start)
+        return text
+
+    def stats(self):
+        return {name: histogram.snapshot() for name, histogram in self._histograms.items()}
+
+
+llm_client = LLMClient(FakeBackend() if LLM_BACKEND == "fake" else GeminiBackend())
@@ -0,0 +1,187 @@
+import argparse
+import logging
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+
+from pymongo import ReplaceOne, UpdateOne
+
+from timestamps import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("sleep", "water", "exercise")
+PERIODS = ("day", "week")
+BACKFILL_BATCH_SIZE = 1000
+
+_UNSAFE_KEY = re.compile(r"[.$]")
+
+
+def _as_datetime(timestamp):
+    # Buckets follow the server-local calendar, like the "today" views elsewhere.
+    return parse_timestamp(timestamp).astimezone()
+
+
+def day_key(timestamp):
+    return _as_datetime(timestamp).date().isoformat()
+
+
+def week_key(timestamp):
+    year, week, _ = _as_datetime(timestamp).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def period_keys(timestamp):
+    return {"day": day_key(timestamp), "week": week_key(timestamp)}
+
+
+def _mood_field(log):
+    return _UNSAFE_KEY.sub("_", str(log.get("mood") or "N/A").strip()) or "N/A"
+
+
+def _values(log):
+    return {metric: float(log.get(metric) or 0) for metric in METRICS}
+
+
+def aggregate_id(user_id, period, key):
+    return f"{user_id}:{period}:{key}"
+
+
+def log_update_operations(user_id, log):
+    """Upserts that fold one log into its day and week aggregate documents."""
+    values = _values(log)
+    operations = []
+    for period, key in period_keys(log.get("timestamp")).items():
+        operations.append(UpdateOne(
+            {"_id": aggregate_id(user_id, period, key)},
+            {
+                "$setOnInsert": {"user_id": user_id, "period": period, "key": key},
+                "$inc": {
+                    "count": 1,
+                    f"moods.{_mood_field(log)}": 1,
+                    **{f"sum.{metric}": value for metric, value in values.items()},
+                },
+                "$min": {f"min.{metric}": value for metric, value in values.items()},
+                "$max": {f"max.{metric}": value for metric, value in values.items()},
+            },
+            upsert=True
+        ))
+    return operations
+
+
+def apply_logs(collection, user_id, logs):
+    operations = [op for log in logs for op in log_update_operations(user_id, log)]
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+
+def parse_range(value):
+    """'14d' -> ("day", 14), '8w' -> ("week", 8)."""
+    match = re.fullmatch(r"(\d+)([dw])", value.strip().lower())
+    if not match or int(match.group(1)) < 1:
+        raise ValueError("range must look like '30d' or '12w'")
+    return ("day" if match.group(2) == "d" else "week"), int(match.group(1))
+
+
+def summarize(collection, user_id, period, count, today=None):
+    """Read at most ``count`` aggregate documents and shape them for the API."""
+    today = today or datetime.now()
+    start = today - (timedelta(days=count - 1) if period == "day" else timedelta(weeks=count - 1))
+    start_key = day_key(start) if period == "day" else week_key(start)
+    docs = collection.find(
+        {"user_id": user_id, "period": period, "key": {"$gte": start_key}},
+        {"_id": 0, "user_id": 0}
+    ).sort("key", 1)
+
+    buckets = []
+    totals = {"count": 0, "sum": dict.fromkeys(METRICS, 0.0), "moods": Counter()}
+    for doc in docs:
+        n = doc.get("count", 0)
+        bucket = {"key": doc["key"], "count": n, "moods": doc.get("moods", {})}
+        for metric in METRICS:
+            total = doc.get("sum", {}).get(metric, 0.0)
+            bucket[metric] = {
+                "total": total,
+                "mean": round(total / n, 2) if n else 0.0,
+                "min": doc.get("min", {}).get(metric),
+                "max": doc.get("max", {}).get(metric),
+            }
+            totals["sum"][metric] += total
+        totals["count"] += n
+        totals["moods"].update(bucket["moods"])
+        buckets.append(bucket)
+
+    overall = {"count": totals["count"], "moods": dict(totals["moods"])}
+    for metric in METRICS:
+        total = totals["sum"][metric]
+        overall[metric] = {"total": total, "mean": round(total / totals["count"], 2) if totals["count"] else 0.0}
+    return {"period": period, "buckets": buckets, "overall": overall}
+
+
+def _empty_aggregate(user_id, period, key):
+    return {
+        "_id": aggregate_id(user_id, period, key),
+        "user_id": user_id,
+        "period": period,
+        "key": key,
+        "count": 0,
+        "sum": dict.fromkeys(METRICS, 0.0),
+        "min": {},
+        "max": {},
+        "moods": {},
+    }
+
+
+def _flush(collection, aggregates):
+    if aggregates:
+        collection.bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in aggregates.values()], ordered=False)
+    return len(aggregates)
+
+
+def backfill(logs_collection, aggregates_collection):
+    """Rebuild every aggregate from raw logs in a single pass sorted by user.
+
+    Only one user's aggregates are held in memory at a time.
+    """
+    aggregates_collection.delete_many({})
+    current_user, aggregates = None, {}
+    logs_seen = written = 0
+    cursor = logs_collection.find({}, {"_id": 0, "user_id": 1, "timestamp": 1, "mood": 1, **dict.fromkeys(METRICS, 1)})
+    for log in cursor.sort("user_id", 1).batch_size(BACKFILL_BATCH_SIZE):
+        user_id = log.get("user_id")
+        if user_id != current_user:
+            written += _flush(aggregates_collection, aggregates)
+            current_user, aggregates = user_id, {}
+        try:
+            keys = period_keys(log.get("timestamp"))
+        except ValueError:
+            logger.warning(f"Skipping log with unparseable timestamp for user {user_id}: {log.get('timestamp')}")
+            continue
+        values = _values(log)
+        mood = _mood_field(log)
+        for period, key in keys.items():
+            doc = aggregates.get((period, key))
+            if doc is None:
+                doc = aggregates[(period, key)] = _empty_aggregate(user_id, period, key)
+            doc["count"] += 1
+            doc["moods"][mood] = doc["moods"].get(mood, 0) + 1
+            for metric, value in values.items():
+                doc["sum"][metric] += value
+                doc["min"][metric] = min(doc["min"].get(metric, value), value)
+                doc["max"][metric] = max(doc["max"].get(metric, value), value)
+        logs_seen += 1
+        if logs_seen % 10000 == 0:
+            logger.info(f"Backfill progress: {logs_seen} logs processed")
+    written += _flush(aggregates_collection, aggregates)
+    logger.info(f"Backfill complete: {logs_seen} logs folded into {written} aggregate documents")
+    return logs_seen, written
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Maintain per-user health log aggregates")
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+
+    from database import logs_collection, log_aggregates_collection
+    backfill(logs_collection, log_aggregates_collection)
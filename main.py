@@ -1,34 +1,57 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File, Form, Depends, Request, Response
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
 import google.generativeai as genai
 import os
+import io
+import zlib
 import json
+import asyncio
 from dotenv import load_dotenv
 import logging
 import re
-from pymongo import MongoClient
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 import hashlib
 from datetime import datetime, timedelta
 from bson import ObjectId
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import pdfplumber
 import tempfile
-from starlette.responses import FileResponse
+from starlette.responses import FileResponse, StreamingResponse
 from fastapi import APIRouter, Depends, HTTPException
 from pymongo.collection import Collection
 from bson import ObjectId
 from datetime import datetime
 import logging
 from google.api_core import exceptions as google_exceptions
+from cache import TTLCache
+from llm import llm_client
+from nutrition_cache import NutritionCache, NUTRIENT_FIELDS
+from medicine_index import MedicineIndex, normalize_medicine_name
+from report_jobs import ReportJobQueue
+from report_renderer import REPORT_LOG_BATCH_SIZE, log_query, render_report
+from report_context import build_report_context, REPORT_RECENT_ANALYSES
+import log_aggregates
+import fitness_rollups
+import calories
+from email_outbox import EmailOutbox
+import ledger
+from ledger import Ledger, LedgerConflict
+from pagination import PageParams, fetch_page, set_cursor_header, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
+from batch_ingest import read_batch, validate_batch, insert_batch, summarize as batch_summary
+from timestamps import utcnow, parse_timestamp, local_day_bounds
+from indexes import ensure_indexes, missing_indexes, explain_canonical_queries
+import report_renderer
+from database import (
+    client, db, run_db, find_all, aggregate_all,
+    users_collection, logs_collection, meds_collection,
+    nutrition_collection, fitness_collection, reports_collection, forum_collection,
+    doctors_collection, appointments_collection, nutrition_cache_collection,
+    log_aggregates_collection, fitness_weekly_collection,
+    ledger_collection, ledger_checkpoints_collection, ledger_ranges_collection, blockchain_meta_collection,
+    email_outbox_collection,
+)
+import database
 
 # --- Setup Logging ---
 logging.basicConfig(
@@ -48,27 +71,6 @@ if not GEMINI_API_KEY or not EMAIL_USER or not EMAIL_PASS:
     raise ValueError("GEMINI_API_KEY, EMAIL_USER, and EMAIL_PASS required")
 genai.configure(api_key=GEMINI_API_KEY)
 
-# --- Database Setup ---
-try:
-    client = MongoClient("mongodb://localhost:27017/", serverSelectionTimeoutMS=5000)
-    client.server_info()  # Test connection
-    logger.info("MongoDB connection established")
-except Exception as e:
-    logger.error(f"MongoDB connection failed: {str(e)}")
-    raise ConnectionError("Failed to connect to MongoDB")
-
-db = client["healthchain_db"]
-users_collection = db["users"]
-logs_collection = db["health_logs"]
-meds_collection = db["medications"]
-blockchain_collection = db["blockchain"]
-nutrition_collection = db["nutrition"]
-fitness_collection = db["fitness"]
-reports_collection = db["reports"]
-forum_collection = db["forum"]
-doctors_collection = db["doctors"]
-appointments_collection = db["appointments"]
-
 # --- FastAPI App ---
 app = FastAPI()
 
@@ -82,6 +84,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Cache", "X-Cache-Tier"],
 )
 
 # --- Models ---
@@ -101,7 +104,7 @@ class Log(BaseModel):
     water: float
     exercise: float
     note: Optional[str] = None
-    timestamp: str = str(datetime.now())
+    timestamp: Optional[datetime] = None
 
 class Trend(BaseModel):
     current_week: float
@@ -116,7 +119,7 @@ class Med(BaseModel):
     name: str
     time: str
     dosage: str
-    timestamp: str
+    timestamp: Optional[datetime] = None
 
 class NutritionInput(BaseModel):
     food_item: str
@@ -124,7 +127,7 @@ class NutritionInput(BaseModel):
     protein: float
     fats: float
     carbs: float
-    timestamp: str
+    timestamp: Optional[datetime] = None
 
 class FetchNutritionInput(BaseModel):
     food_item: str
@@ -133,7 +136,7 @@ class FitnessInput(BaseModel):
     exercise_name: str
     duration: int
     intensity: int
-    timestamp: str
+    timestamp: Optional[datetime] = None
     weight: Optional[float] = None
     goal: Optional[str] = None
     fitness_level: Optional[str] = None
@@ -141,7 +144,7 @@ class FitnessInput(BaseModel):
 class ForumPost(BaseModel):
     title: str
     content: str
-    timestamp: str
+    timestamp: Optional[datetime] = None
     user_id: str = "anonymous"
 
 class EmailReminder(BaseModel):
@@ -161,6 +164,15 @@ class PlanResponse(BaseModel):
     message: Optional[str] = None
     nutrition_summary: Optional[str] = None
 
+class EstimateSession(BaseModel):
+    exercise_name: str
+    duration: float = Field(ge=0)
+    intensity: Optional[int] = Field(default=None, ge=1, le=10)
+    weight: Optional[float] = None
+
+class EstimateRequest(BaseModel):
+    sessions: List[EstimateSession]
+
 class ProgressResponse(BaseModel):
     weekly_calories: list[WeeklyCalories]
     duration_trend: Trend
@@ -184,86 +196,119 @@ class Appointment(BaseModel):
     doctor_id: str
     patient_name: Optional[str] = None
     patient_email: str
-    requested_at: str = str(datetime.now())
+    requested_at: Optional[datetime] = None
     status: str = "pending"
-    accepted_at: Optional[str] = None
+    accepted_at: Optional[datetime] = None
 
-SESSION_TIMEOUT = timedelta(hours=24)
+# Fields clients may request through ?fields= on the list endpoints
+LOG_FIELDS = ("mood", "sleep", "water", "exercise", "note", "timestamp")
+FORUM_FIELDS = ("title", "content", "timestamp", "user_id")
+FITNESS_FIELDS = ("exercise_name", "duration", "intensity", "timestamp", "weight", "goal", "fitness_level")
+MED_FIELDS = ("name", "time", "dosage", "timestamp")
+NUTRITION_FIELDS = ("food_item", "calories", "protein", "fats", "carbs", "timestamp")
+REPORT_FIELDS = ("username", "analysis", "timestamp", "pdf_path", "period", "logs")
 
-def get_session(request: Request):
-    session_id = request.cookies.get("session_id")
-    if not session_id:
-        return None
-    user = users_collection.find_one({"session_id": session_id})
-    if not user or not user.get("session_id") or datetime.fromisoformat(user.get("session_expiry", "2000-01-01")) < datetime.now():
+SESSION_TIMEOUT = timedelta(hours=24)
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+
+# --- Session Cache ---
+# Shared by the check_session middleware and the get_session / get_doctor_session
+# dependencies. Entries live until the session itself expires (at most SESSION_TIMEOUT)
+# and are dropped explicitly on login and logout.
+session_cache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_TIMEOUT.total_seconds())
+doctor_session_cache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_TIMEOUT.total_seconds())
+
+async def load_session(collection, cache, session_id):
+    account = cache.get(session_id)
+    if account is not None:
+        return account
+    account = await run_db(collection.find_one, {"session_id": session_id})
+    if not account or not account.get("session_id"):
         return None
-    return user
-
-def get_doctor_session(request: Request):
-    session_id = request.cookies.get("doctor_session_id")
-    if not session_id:
+    try:
+        remaining = (parse_timestamp(account.get("session_expiry")) - utcnow()).total_seconds()
+    except ValueError:
         return None
-    doctor = doctors_collection.find_one({"session_id": session_id})
-    if not doctor or not doctor.get("session_id") or datetime.fromisoformat(doctor.get("session_expiry", "2000-01-01")) < datetime.now():
+    if remaining <= 0:
         return None
-    return doctor
+    cache.set(session_id, account, ttl=min(remaining, cache.ttl))
+    return account
+
+async def resolve_session(request: Request, doctor: bool = False):
+    # The result is memoized on request.state so the check_session middleware and the
+    # endpoint dependency share a single lookup per request.
+    attr = "doctor_session" if doctor else "session"
+    if hasattr(request.state, attr):
+        return getattr(request.state, attr)
+    session_id = request.cookies.get("doctor_session_id" if doctor else "session_id")
+    account = None
+    if session_id:
+        if doctor:
+            account = await load_session(doctors_collection, doctor_session_cache, session_id)
+        else:
+            account = await load_session(users_collection, session_cache, session_id)
+    setattr(request.state, attr, account)
+    return account
+
+async def get_session(request: Request):
+    return await resolve_session(request)
+
+async def get_doctor_session(request: Request):
+    return await resolve_session(request, doctor=True)
 
 # --- Email Sending Function ---
-def send_email(to_email, subject, body):
-    msg = MIMEMultipart()
-    msg['From'] = EMAIL_USER
-    msg['To'] = to_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain'))
+# Emails are written to the outbox collection and sent by its worker over one pooled
+# SMTP connection (see email_outbox.py); handlers only pay for the insert.
+email_outbox = EmailOutbox(email_outbox_collection)
+
+async def send_email(to_email, subject, body):
     try:
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.starttls()
-            server.login(EMAIL_USER, EMAIL_PASS)
-            server.send_message(msg)
-        logger.info(f"Email sent to {to_email}")
+        email_id = await run_db(email_outbox.enqueue, to_email, subject, body)
+        email_outbox.notify()
+        logger.info(f"Email {email_id} to {to_email} queued")
     except Exception as e:
-        logger.error(f"Failed to send email: {str(e)}")
+        logger.error(f"Failed to queue email: {str(e)}")
 
 # --- Authentication Routes ---
 @app.post("/api/register")
 async def register(
-    background_tasks: BackgroundTasks,
     user: User,
     response: Response
 ):
     logger.info(f"Register attempt for username: {user.username}")
-    if users_collection.find_one({"username": user.username}):
+    if await run_db(users_collection.find_one, {"username": user.username}):
         raise HTTPException(status_code=400, detail="Username already exists")
     hashed = hashlib.sha256((user.password + "salt").encode()).hexdigest()
     session_id = hashlib.sha256(os.urandom(16)).hexdigest()
-    expiry = datetime.now() + SESSION_TIMEOUT
-    users_collection.insert_one({
+    expiry = utcnow() + SESSION_TIMEOUT
+    await run_db(users_collection.insert_one, {
         "username": user.username,
         "password": hashed,
         "email": user.email,
         "session_id": session_id,
-        "session_expiry": expiry.isoformat()
+        "session_expiry": expiry
     })
     response.set_cookie(key="session_id", value=session_id, httponly=True, path="/")
-    background_tasks.add_task(send_welcome_email, user.email)
+    await send_welcome_email(user.email)
     return {"status": "success", "redirect": "/static/index.html"}
 
-def send_welcome_email(email):
-    logger.info(f"Welcome email sent to {email}: Thank you for joining HealthChain!")
-    send_email(email, "Welcome to HealthChain", "Thank you for joining HealthChain!")
+async def send_welcome_email(email):
+    await send_email(email, "Welcome to HealthChain", "Thank you for joining HealthChain!")
 
 @app.post("/api/login")
 async def login(response: Response, username: str = Form(...), password: str = Form(...)):
     logger.info(f"Login attempt for username: {username}")
     hashed = hashlib.sha256((password + "salt").encode()).hexdigest()
-    user = users_collection.find_one({"username": username, "password": hashed})
+    user = await run_db(users_collection.find_one, {"username": username, "password": hashed})
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if user.get("session_id"):
+        session_cache.invalidate(user["session_id"])
     session_id = hashlib.sha256(os.urandom(16)).hexdigest()
-    expiry = datetime.now() + SESSION_TIMEOUT
-    users_collection.update_one(
+    expiry = utcnow() + SESSION_TIMEOUT
+    await run_db(users_collection.update_one,
         {"_id": user["_id"]},
-        {"$set": {"session_id": session_id, "session_expiry": expiry.isoformat()}}
+        {"$set": {"session_id": session_id, "session_expiry": expiry}}
     )
     response.set_cookie(key="session_id", value=session_id, httponly=True, path="/")
     logger.info(f"Login successful for {username}, session_id: {session_id}")
@@ -273,7 +318,8 @@ async def login(response: Response, username: str = Form(...), password: str = F
 async def logout(response: Response, session: dict = Depends(get_session)):
     try:
         if session:
-            users_collection.update_one(
+            session_cache.invalidate(session["session_id"])
+            await run_db(users_collection.update_one,
                 {"_id": session["_id"]},
                 {"$set": {"session_id": None, "session_expiry": None}}
             )
@@ -287,45 +333,45 @@ async def logout(response: Response, session: dict = Depends(get_session)):
 # --- Doctor Authentication Routes ---
 @app.post("/api/doctors/register")
 async def doctor_register(
-    background_tasks: BackgroundTasks,
     doctor: DoctorRegister,
     response: Response
 ):
     logger.info(f"Doctor registration attempt for email: {doctor.email}")
-    if doctors_collection.find_one({"email": doctor.email}):
+    if await run_db(doctors_collection.find_one, {"email": doctor.email}):
         raise HTTPException(status_code=400, detail="Email already registered")
     hashed = hashlib.sha256((doctor.password + "salt").encode()).hexdigest()
     session_id = hashlib.sha256(os.urandom(16)).hexdigest()
-    expiry = datetime.now() + SESSION_TIMEOUT
+    expiry = utcnow() + SESSION_TIMEOUT
     doctor_data = {
         "name": doctor.name,
         "email": doctor.email,
         "password": hashed,
         "location": doctor.location,
         "session_id": session_id,
-        "session_expiry": expiry.isoformat()
+        "session_expiry": expiry
     }
-    doctor_id = doctors_collection.insert_one(doctor_data).inserted_id
+    doctor_id = (await run_db(doctors_collection.insert_one, doctor_data)).inserted_id
     response.set_cookie(key="doctor_session_id", value=session_id, httponly=True, path="/")
-    background_tasks.add_task(send_doctor_welcome_email, doctor.email)
+    await send_doctor_welcome_email(doctor.email)
     return {"status": "success", "doctor_id": str(doctor_id), "redirect": "/static/doctors_login.html"}
 
-def send_doctor_welcome_email(email):
-    logger.info(f"Welcome email sent to doctor {email}")
-    send_email(email, "Welcome to HealthChain as a Doctor", "Thank you for joining HealthChain as a doctor!")
+async def send_doctor_welcome_email(email):
+    await send_email(email, "Welcome to HealthChain as a Doctor", "Thank you for joining HealthChain as a doctor!")
 
 @app.post("/api/doctors/login")
 async def doctor_login(response: Response, email: str = Form(...), password: str = Form(...)):
     logger.info(f"Doctor login attempt for email: {email}")
     hashed = hashlib.sha256((password + "salt").encode()).hexdigest()
-    doctor = doctors_collection.find_one({"email": email, "password": hashed})
+    doctor = await run_db(doctors_collection.find_one, {"email": email, "password": hashed})
     if not doctor:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if doctor.get("session_id"):
+        doctor_session_cache.invalidate(doctor["session_id"])
     session_id = hashlib.sha256(os.urandom(16)).hexdigest()
-    expiry = datetime.now() + SESSION_TIMEOUT
-    doctors_collection.update_one(
+    expiry = utcnow() + SESSION_TIMEOUT
+    await run_db(doctors_collection.update_one,
         {"_id": doctor["_id"]},
-        {"$set": {"session_id": session_id, "session_expiry": expiry.isoformat()}}
+        {"$set": {"session_id": session_id, "session_expiry": expiry}}
     )
     response.set_cookie(key="doctor_session_id", value=session_id, httponly=True, path="/")
     logger.info(f"Doctor login successful for {email}, session_id: {session_id}")
@@ -335,7 +381,8 @@ async def doctor_login(response: Response, email: str = Form(...), password: str
 async def doctor_logout(response: Response, session: dict = Depends(get_doctor_session)):
     try:
         if session:
-            doctors_collection.update_one(
+            doctor_session_cache.invalidate(session["session_id"])
+            await run_db(doctors_collection.update_one,
                 {"_id": session["_id"]},
                 {"$set": {"session_id": None, "session_expiry": None}}
             )
@@ -363,16 +410,12 @@ async def get_accepted_appointments(date: str = None, session: dict = Depends(ge
         
         if date:
             try:
-                start_date = datetime.strptime(date, "%Y-%m-%d")
-                end_date = start_date.replace(hour=23, minute=59, second=59)
-                query["accepted_at"] = {
-                    "$gte": start_date.isoformat(),
-                    "$lte": end_date.isoformat()
-                }
+                start, end = local_day_bounds(datetime.strptime(date, "%Y-%m-%d").date())
+                query["accepted_at"] = {"$gte": start, "$lt": end}
             except ValueError:
                 raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD.")
         
-        appointments = list(appointments_collection.find(query).sort("accepted_at", 1))
+        appointments = await find_all(appointments_collection, query, sort=[("accepted_at", 1)])
         for app in appointments:
             app["_id"] = str(app["_id"])
             app["doctor_id"] = str(app["doctor_id"])
@@ -388,7 +431,7 @@ async def get_doctors(session: dict = Depends(get_session)):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
-        doctors = list(doctors_collection.find({}, {"password": 0, "session_id": 0, "session_expiry": 0}))
+        doctors = await find_all(doctors_collection, {}, {"password": 0, "session_id": 0, "session_expiry": 0})
         for doctor in doctors:
             doctor["_id"] = str(doctor["_id"])
         logger.info(f"Retrieved {len(doctors)} doctors")
@@ -400,32 +443,31 @@ async def get_doctors(session: dict = Depends(get_session)):
 # --- Appointment Routes ---
 @app.post("/api/appointments/request")
 async def request_appointment(
-    background_tasks: BackgroundTasks,
     appointment: AppointmentRequest,
     session: dict = Depends(get_session)
 ):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
-        doctor = doctors_collection.find_one({"_id": ObjectId(appointment.doctor_id)})
+        doctor = await run_db(doctors_collection.find_one, {"_id": ObjectId(appointment.doctor_id)})
         if not doctor:
             raise HTTPException(status_code=404, detail="Doctor not found")
         appointment_data = {
             "doctor_id": appointment.doctor_id,
             "patient_name": session.get("username", "Anonymous"),
             "patient_email": appointment.patient_email,
-            "requested_at": str(datetime.now()),
+            "requested_at": utcnow(),
             "status": "pending",
             "accepted_at": None
         }
-        appointment_id = appointments_collection.insert_one(appointment_data).inserted_id
-        background_tasks.add_task(send_appointment_email, doctor["email"], appointment_data)
+        appointment_id = (await run_db(appointments_collection.insert_one, appointment_data)).inserted_id
+        await send_appointment_email(doctor["email"], appointment_data)
         return {"status": "success", "appointment_id": str(appointment_id), "message": "Appointment requested! Check your email."}
     except Exception as e:
         logger.error(f"Failed to request appointment: {str(e)}")
         raise HTTPException(status_code=500, detail="Database error")
 
-def send_appointment_email(doctor_email, appointment):
+async def send_appointment_email(doctor_email, appointment):
     subject = "New Appointment Request"
     body = (
         f"Dear Dr. {doctor_email.split('@')[0]},\n\n"
@@ -437,14 +479,14 @@ def send_appointment_email(doctor_email, appointment):
         f"Please log in to your dashboard to accept or reject this appointment.\n\n"
         f"Best,\nHealthChain Team"
     )
-    send_email(doctor_email, subject, body)
+    await send_email(doctor_email, subject, body)
 
 @app.get("/api/doctors/appointments")
 async def get_doctor_appointments(session: dict = Depends(get_doctor_session)):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
-        appointments = list(appointments_collection.find({"doctor_id": str(session["_id"]), "status": "pending"}, {"_id": 1, "patient_name": 1, "patient_email": 1, "requested_at": 1}))
+        appointments = await find_all(appointments_collection, {"doctor_id": str(session["_id"]), "status": "pending"}, {"_id": 1, "patient_name": 1, "patient_email": 1, "requested_at": 1})
         for app in appointments:
             app["_id"] = str(app["_id"])
         logger.info(f"Retrieved {len(appointments)} pending appointments for doctor {session['name']}")
@@ -455,28 +497,27 @@ async def get_doctor_appointments(session: dict = Depends(get_doctor_session)):
 
 @app.post("/api/doctors/appointments/{appointment_id}/accept")
 async def accept_appointment(
-    background_tasks: BackgroundTasks,
     appointment_id: str,
     session: dict = Depends(get_doctor_session)
 ):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
-        appointment = appointments_collection.find_one({"_id": ObjectId(appointment_id), "doctor_id": str(session["_id"]), "status": "pending"})
+        appointment = await run_db(appointments_collection.find_one, {"_id": ObjectId(appointment_id), "doctor_id": str(session["_id"]), "status": "pending"})
         if not appointment:
             raise HTTPException(status_code=404, detail="Appointment not found or already processed")
-        accepted_at = str(datetime.now())
-        appointments_collection.update_one(
+        accepted_at = utcnow()
+        await run_db(appointments_collection.update_one,
             {"_id": ObjectId(appointment_id)},
             {"$set": {"status": "accepted", "accepted_at": accepted_at}}
         )
-        background_tasks.add_task(send_acceptance_email, appointment["patient_email"], appointment)
+        await send_acceptance_email(appointment["patient_email"], appointment)
         return {"status": "success", "message": "Appointment accepted!"}
     except Exception as e:
         logger.error(f"Failed to accept appointment: {str(e)}")
         raise HTTPException(status_code=500, detail="Database error")
 
-def send_acceptance_email(patient_email, appointment):
+async def send_acceptance_email(patient_email, appointment):
     subject = "Appointment Accepted"
     body = (
         f"Dear {appointment['patient_name']},\n\n"
@@ -487,20 +528,20 @@ def send_acceptance_email(patient_email, appointment):
         f"Please contact your doctor at {appointment['doctor_id']} for further details.\n\n"
         f"Best,\nHealthChain Team"
     )
-    send_email(patient_email, subject, body)
+    await send_email(patient_email, subject, body)
 
 @app.post("/api/send-email-reminder")
 async def send_email_reminder(reminder: EmailReminder, session: dict = Depends(get_session)):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
-        user = users_collection.find_one({"_id": ObjectId(session["_id"])})
+        user = await run_db(users_collection.find_one, {"_id": ObjectId(session["_id"])})
         if not user or not user.get("email"):
             raise HTTPException(status_code=400, detail="User email not found")
         reminder_time = datetime.fromtimestamp(reminder.time / 1000)
         subject = f"Medication Reminder: {reminder.name}"
         body = f"Dear {user['username']},\n\nThis is a reminder to take your {reminder.name} at {reminder_time.strftime('%H:%M')}.\n\nBest,\nHealthChain Team"
-        send_email(user["email"], subject, body)
+        await send_email(user["email"], subject, body)
         return {"status": "success", "message": f"Email reminder scheduled for {reminder.name} at {reminder_time.strftime('%H:%M')}"}
     except Exception as e:
         logger.error(f"Failed to send email reminder: {str(e)}")
@@ -524,7 +565,7 @@ async def check_session(request: Request, call_next):
         "/static/doctors_register.html"
     )
     if not any(request.url.path.startswith(path) for path in excluded_paths) and request.url.path != "/":
-        session = get_session(request) if "doctor" not in request.url.path else get_doctor_session(request)
+        session = await resolve_session(request, doctor="doctor" in request.url.path)
         if not session:
             logger.warning(f"Unauthorized access attempt to {request.url.path}")
             return Response(status_code=302, headers={"Location": "/static/login.html" if "doctor" not in request.url.path else "/static/doctors_login.html"})
@@ -541,121 +582,429 @@ app.middleware("http")(check_session)
 @app.get("/api/debug")
 async def debug():
     try:
-        client.server_info()
+        await run_db(client.server_info)
         return {
             "status": "success",
             "mongodb": "connected",
-            "collections": db.list_collection_names()
+            "collections": await run_db(db.list_collection_names),
+            "mongo_pool": database.pool_stats.stats(),
+            "session_cache": session_cache.stats(),
+            "doctor_session_cache": doctor_session_cache.stats(),
+            "llm_latency": llm_client.stats(),
+            "nutrition_cache": nutrition_cache.stats(),
+            "medicine_verdicts": medicine_verdicts.stats(),
+            "symptom_cache": symptom_cache.stats(),
+            "blockchain_status_cache": blockchain_status_cache.stats(),
+            "report_jobs": report_jobs.stats(),
+            "email_outbox": email_outbox.stats()
         }
     except Exception as e:
         logger.error(f"Debug endpoint failed: {str(e)}")
         return {"status": "error", "mongodb": "disconnected", "error": str(e)}
 
+@app.get("/api/debug/indexes")
+async def debug_indexes(session: dict = Depends(get_session)):
+    # check_session lets /api/debug through; explaining every canonical query is not free.
+    if not session:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    try:
+        plans = await run_db(explain_canonical_queries, db)
+        return {
+            "status": "success",
+            "missing_indexes": await run_db(missing_indexes, db),
+            "collscans": [plan["query"] for plan in plans if plan["collscan"]],
+            "queries": plans
+        }
+    except Exception as e:
+        logger.error(f"Index report failed: {str(e)}")
+        return {"status": "error", "error": str(e)}
+
 # --- Symptom Checker Endpoint ---
+SYMPTOM_RULES = {
+    "fever": {"medicine": "Paracetamol", "dosage": "500mg every 6 hours as needed"},
+    "cough": {"medicine": "Cough syrup", "dosage": "10ml every 8 hours as needed"},
+    "headache": {"medicine": "Ibuprofen", "dosage": "200mg every 6 hours as needed"},
+}
+CONDITION_PATTERN = re.compile(r"^(?:Condition:)?\s*(.+?)\s*:\s*(\d+)%$")
+SYMPTOM_CACHE_TTL = int(os.getenv("SYMPTOM_CACHE_TTL", "3600"))
+AGE_BAND_YEARS = 10
+
+symptom_cache = TTLCache(maxsize=int(os.getenv("SYMPTOM_CACHE_SIZE", "5000")), ttl=SYMPTOM_CACHE_TTL)
+
+def symptom_cache_key(input: SymptomsInput):
+    symptoms = tuple(sorted({s.strip().lower() for s in input.symptoms if s.strip()}))
+    return symptoms, input.age // AGE_BAND_YEARS * AGE_BAND_YEARS, input.gender.strip().lower()
+
 @app.post("/api/symptoms")
 async def check_symptoms(input: SymptomsInput, session: dict = Depends(get_session)):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
     logger.info(f"Symptom check: symptoms={input.symptoms}, age={input.age}, gender={input.gender}")
+    key = symptom_cache_key(input)
+    cached = symptom_cache.get(key)
+    if cached is not None:
+        logger.info(f"Symptom cache hit for {key}")
+        return cached
+    symptoms, _, _ = key
     try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
         prompt = (
-            f"Given symptoms {', '.join(input.symptoms)}, age {input.age}, gender {input.gender}, "
+            f"Given symptoms {', '.join(symptoms)}, age {input.age}, gender {input.gender}, "
             "list possible conditions with confidence percentages in the format: 'Condition: X%' (one per line). "
             "If no conditions match, return 'No conditions found'. "
             "Include: 'Disclaimer: Not a substitute for medical advice.'"
         )
-        response = model.generate_content(prompt)
-        if not response.text:
+        response_text = await llm_client.generate("gemini-1.5-flash", prompt)
+        if not response_text:
             logger.error("Empty response from Gemini API")
             raise ValueError("No response from Gemini API")
         
-        logger.info(f"Raw response: {response.text}")
+        logger.info(f"Raw response: {response_text}")
         conditions = []
-        for line in response.text.split("\n"):
-            if match := re.match(r"^(?:Condition:)?\s*(.+?)\s*:\s*(\d+)%$", line.strip()):
+        for line in response_text.split("\n"):
+            if match := CONDITION_PATTERN.match(line.strip()):
                 condition, confidence = match.groups()
                 conditions.append({"condition": condition.strip(), "confidence": float(confidence)})
             elif "No conditions found" in line:
-                return {"diagnoses": [], "medicine_suggestions": []}
+                result = {"diagnoses": [], "medicine_suggestions": []}
+                symptom_cache.set(key, result)
+                return result
         
-        medicine_suggestions = []
-        symptom_rules = {
-            "fever": {"medicine": "Paracetamol", "dosage": "500mg every 6 hours as needed"},
-            "cough": {"medicine": "Cough syrup", "dosage": "10ml every 8 hours as needed"},
-            "headache": {"medicine": "Ibuprofen", "dosage": "200mg every 6 hours as needed"},
-        }
-        for symptom in input.symptoms:
-            if symptom.lower() in symptom_rules:
-                medicine_suggestions.append(symptom_rules[symptom.lower()])
+        medicine_suggestions = [SYMPTOM_RULES[symptom] for symptom in symptoms if symptom in SYMPTOM_RULES]
 
         logger.info(f"Parsed: conditions={conditions}, suggestions={medicine_suggestions}")
-        return {"diagnoses": conditions, "medicine_suggestions": medicine_suggestions}
+        result = {"diagnoses": conditions, "medicine_suggestions": medicine_suggestions}
+        symptom_cache.set(key, result)
+        return result
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Symptom check timed out, please try again")
     except Exception as e:
         logger.error(f"Symptom check error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to process symptoms")
 
 # --- Logs Endpoints ---
 @app.get("/api/logs")
-async def get_logs(session: dict = Depends(get_session)):
+async def get_logs(response: Response, page: PageParams = Depends(), session: dict = Depends(get_session)):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
-        logs = list(logs_collection.find({"user_id": str(session["_id"])}, {'_id': 0}))
+        logs, next_cursor = await fetch_page(logs_collection, {"user_id": str(session["_id"])}, page, LOG_FIELDS)
+        set_cursor_header(response, next_cursor)
         logger.info(f"Retrieved {len(logs)} logs for user {session['username']}")
         return logs
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching logs: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch logs")
 
+@app.get("/api/logs/summary")
+async def get_logs_summary(range_: str = Query("30d", alias="range"), session: dict = Depends(get_session)):
+    if not session:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    try:
+        period, count = log_aggregates.parse_range(range_)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if count > 366:
+        raise HTTPException(status_code=400, detail="range is limited to 366 days or weeks")
+    try:
+        summary = await run_db(log_aggregates.summarize, log_aggregates_collection, str(session["_id"]), period, count)
+        return {"range": range_, **summary}
+    except Exception as e:
+        logger.error(f"Error fetching log summary: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch log summary")
+
+def entry_timestamp(value):
+    """Client-supplied timestamp normalized to UTC, or now when absent."""
+    return parse_timestamp(value) if value else utcnow()
+
+def log_limits_error(log: Log):
+    if log.sleep > 10 or log.water > 5 or log.exercise > 300:
+        return "Invalid input: Sleep ≤ 10hrs, Water ≤ 5L, Exercise ≤ 300min"
+    return None
+
 @app.post("/api/logs")
 async def add_log(log: Log, session: dict = Depends(get_session)):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    if log.sleep > 10 or log.water > 5 or log.exercise > 300:
-        raise HTTPException(status_code=400, detail="Invalid input: Sleep ≤ 10hrs, Water ≤ 5L, Exercise ≤ 300min")
+    error = log_limits_error(log)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
     try:
         log_dict = log.dict()
         log_dict["user_id"] = str(session["_id"])
-        log_id = logs_collection.insert_one(log_dict).inserted_id
+        log_dict["timestamp"] = entry_timestamp(log_dict.get("timestamp"))
+        log_id = (await run_db(logs_collection.insert_one, log_dict)).inserted_id
         logger.info(f"Log added with ID {log_id}")
+        try:
+            await run_db(log_aggregates.apply_logs, log_aggregates_collection, log_dict["user_id"], [log_dict])
+        except Exception as e:
+            # The log itself is stored; a missed aggregate update is repaired by the backfill command.
+            logger.warning(f"Failed to update log aggregates for log {log_id}: {str(e)}")
         return {"status": "success", "log_id": str(log_id)}
     except Exception as e:
         logger.error(f"Failed to add log: {str(e)}")
         raise HTTPException(status_code=500, detail="Database error")
 
+@app.post("/api/logs/batch")
+async def add_logs_batch(request: Request, session: dict = Depends(get_session)):
+    if not session:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    items = await read_batch(request)
+    user_id = str(session["_id"])
+    valid, results = validate_batch(items, Log, log_limits_error)
+    try:
+        docs = [(index, {**log.dict(), "user_id": user_id, "timestamp": entry_timestamp(log.timestamp)}) for index, log in valid]
+        inserted = await run_db(insert_batch, logs_collection, docs, results)
+        logger.info(f"Batch of {len(items)} logs: {len(inserted)} inserted")
+        if inserted:
+            try:
+                await run_db(log_aggregates.apply_logs, log_aggregates_collection, user_id, inserted)
+            except Exception as e:
+                logger.warning(f"Failed to update log aggregates for batch: {str(e)}")
+        return batch_summary(results)
+    except Exception as e:
+        logger.error(f"Failed to add log batch: {str(e)}")
+        raise HTTPException(status_code=500, detail="Database error")
+
 # --- Blockchain Endpoints ---
+# Each user has a server-side chain (see ledger.py). The browser keeps its own copy for
+# display and posts the block it just added; the server re-links and re-hashes it onto
+# the user's stored tip, so a save is one insert however long the chain is.
+chain_ledger = Ledger(ledger_collection, ledger_checkpoints_collection, ledger_ranges_collection, blockchain_meta_collection)
+
+# Dashboards poll /api/blockchain/status; it is served from here and refreshed from the
+# blockchain_meta document at most every BLOCKCHAIN_STATUS_TTL seconds. Appends and
+# validations in this process drop the user's entry so they show up immediately.
+BLOCKCHAIN_STATUS_TTL = int(os.getenv("BLOCKCHAIN_STATUS_TTL", "5"))
+blockchain_status_cache = TTLCache(maxsize=int(os.getenv("BLOCKCHAIN_STATUS_CACHE_SIZE", "10000")), ttl=BLOCKCHAIN_STATUS_TTL)
+
 @app.post("/api/blockchain")
 async def save_blockchain(chain_data: List[Dict], session: dict = Depends(get_session)):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
+    new_block = chain_data[-1] if chain_data else None
+    if not new_block or not new_block.get("index"):
+        return {"status": "success", "appended": False}
     try:
-        blockchain_collection.delete_many({})
-        result = blockchain_collection.insert_many(chain_data)
-        logger.info(f"Blockchain saved with {len(result.inserted_ids)} blocks")
-        return {"status": "success"}
+        user_id = str(session["_id"])
+        tip = await run_db(chain_ledger.tip, user_id)
+        if new_block.get("hash") and tip.get("client_hash") == new_block["hash"]:
+            # A retried save of the block we already appended.
+            return {"status": "success", "appended": False, "block": {k: v for k, v in tip.items() if k != "client_hash"}}
+        block = await run_db(chain_ledger.append, user_id, new_block.get("data"), client_hash=new_block.get("hash"))
+        blockchain_status_cache.invalidate(user_id)
+        logger.info(f"Block {block['index']} appended to ledger for user {user_id}")
+        return {"status": "success", "appended": True, "block": block}
+    except LedgerConflict as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=409, detail="Concurrent blockchain update, please retry")
     except Exception as e:
         logger.error(f"Error saving blockchain: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to save blockchain")
 
+@app.get("/api/blockchain")
+async def get_blockchain(
+    after: int = Query(0, ge=0, description="Return blocks with a higher index"),
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    session: dict = Depends(get_session)
+):
+    if not session:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    try:
+        blocks = await run_db(lambda: [
+            {k: v for k, v in block.items() if k != "client_hash"}
+            for block in chain_ledger.chain(str(session["_id"]), after_index=after, limit=limit)
+        ])
+        return {"blocks": blocks}
+    except Exception as e:
+        logger.error(f"Error fetching blockchain: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch blockchain")
+
+@app.get("/api/blockchain/validate")
+async def validate_blockchain(full: bool = False, session: dict = Depends(get_session)):
+    if not session:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    try:
+        user_id = str(session["_id"])
+        if full:
+            # Rehashing everything is CPU-bound; spread it over the ledger process pool.
+            # The run is driven from ledger's own threads so it cannot starve db_executor.
+            result = await asyncio.get_running_loop().run_in_executor(
+                ledger.get_validation_executor(), chain_ledger.verify_parallel, user_id
+            )
+        else:
+            result = await run_db(chain_ledger.validate, user_id)
+        blockchain_status_cache.invalidate(user_id)
+        return result
+    except Exception as e:
+        logger.error(f"Blockchain validation failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to validate blockchain")
+
+@app.get("/api/blockchain/proof/{index}")
+async def get_blockchain_proof(index: int, session: dict = Depends(get_session)):
+    if not session:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if index < 1:
+        raise HTTPException(status_code=400, detail="The genesis block needs no proof")
+    try:
+        proof = await run_db(chain_ledger.proof, str(session["_id"]), index)
+    except Exception as e:
+        logger.error(f"Blockchain proof failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to build blockchain proof")
+    if not proof:
+        raise HTTPException(status_code=404, detail="Block not found")
+    return proof
+
 @app.get("/api/blockchain/status")
 async def get_blockchain_status(session: dict = Depends(get_session)):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
-        blockchain_data = list(blockchain_collection.find().limit(1))
-        return {"status": "active" if blockchain_data else "inactive", "last_update": str(datetime.now())}
+        user_id = str(session["_id"])
+        status = blockchain_status_cache.get(user_id)
+        if status is None:
+            meta = await run_db(chain_ledger.status, user_id)
+            status = {
+                "status": "active" if meta["head_index"] > 0 else "inactive",
+                "length": meta["length"],
+                "last_update": meta["last_append"],
+                "last_hash": meta["head_hash"],
+                "last_verified": meta["last_verified"]
+            }
+            blockchain_status_cache.set(user_id, status)
+        return status
     except Exception as e:
         logger.error(f"Blockchain status check failed: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to check blockchain status")
 
 # --- Reports Endpoints ---
+IMAGE_ANALYSIS_PROMPT = (
+    "Analyze the provided image for health-related content. Identify any visible medical conditions, injuries, "
+    "or skin issues with high specificity (e.g., rash, bruise, swelling, cut, burn). Structure the response as follows:\n"
+    "- **Condition**: [Exact condition or 'Unable to determine' if unclear]\n"
+    "- **Description**: [Detailed description of the observed issue, including any visible signs or abnormalities]\n"
+    "- **Possible Diagnosis**: [Specific diagnosis if detectable, e.g., 'Eczema', 'Second-degree burn', or 'N/A']\n"
+    "- **Suggested Actions**: [Detailed steps, e.g., 'Clean with soap and water, apply antiseptic', 'Seek medical attention']\n"
+    "- **Medication Suggestions**: [Specific over-the-counter options, e.g., 'Hydrocortisone cream for inflammation', 'N/A']\n"
+    "Include: 'Disclaimer: Not a substitute for professional medical advice.' at the end."
+)
+
+REPORT_LOG_FIELDS = {"_id": 0, "timestamp": 1, "mood": 1, "sleep": 1, "water": 1, "exercise": 1, "note": 1}
+
+def report_date_bounds(start_date: Optional[str], end_date: Optional[str]):
+    bounds = {}
+    try:
+        if start_date:
+            bounds["$gte"] = local_day_bounds(datetime.strptime(start_date, "%Y-%m-%d").date())[0]
+        if end_date:
+            bounds["$lt"] = local_day_bounds(datetime.strptime(end_date, "%Y-%m-%d").date())[1]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD.")
+    return bounds
+
+async def run_report_pipeline(user_id, username, logs=None, image=None, stream=False, date_bounds=None, period=None, progress=None):
+    progress = progress or (lambda stage, percent: None)
+
+    progress("collecting", 10)
+    query = {"user_id": user_id}
+    if date_bounds:
+        query["timestamp"] = date_bounds
+    # Stored logs are streamed twice, once here for the context and once by the renderer
+    # through its own cursor, so neither side ever holds the whole history.
+    log_source = logs or log_query(logs_collection.name, query, REPORT_LOG_FIELDS)
+
+    report_analyses = await find_all(
+        reports_collection, {"user_id": user_id}, {"_id": 0, "analysis": 1, "timestamp": 1},
+        sort=[("_id", -1)], limit=REPORT_RECENT_ANALYSES
+    )
+    history_context = await run_db(lambda: build_report_context(
+        logs or logs_collection.find(query, REPORT_LOG_FIELDS, sort=[("timestamp", 1)]).batch_size(REPORT_LOG_BATCH_SIZE),
+        report_analyses
+    ))
+    logger.info(f"Report context for {user_id} summarized into {len(history_context)} chars")
+
+    image_analysis = ""
+    if image:
+        progress("analyzing_image", 25)
+        from PIL import Image
+        with Image.open(io.BytesIO(image)) as img:
+            response_text = await llm_client.generate("gemini-1.5-pro", [IMAGE_ANALYSIS_PROMPT, img])
+            if not response_text:
+                raise ValueError("No response from Gemini API for image analysis")
+            image_analysis = response_text.strip()
+
+    progress("summarizing", 45)
+    prompt = (
+        f"Generate a detailed health report summary for user {username} based on the following data:\n"
+        f"{history_context}\n"
+        f"Image Analysis:\n{image_analysis if image_analysis else 'No image analysis available.'}\n"
+        "Structure the response as follows:\n"
+        "- **Condition**: [Overall health condition or 'N/A' if unclear, incorporating image and log data]\n"
+        "- **Description**: [Detailed description based on logs, previous analyses, and image analysis]\n"
+        "- **Possible Diagnosis**: [General diagnosis if detectable, e.g., 'Fatigue', 'Typhoid Fever', or 'N/A']\n"
+        "- **Suggested Actions**: [Comprehensive recommendations based on all data]\n"
+        "- **Medication Suggestions**: [General suggestions based on all data, e.g., 'Multivitamins if deficient', 'N/A']\n"
+        "Include: 'Disclaimer: Not a substitute for professional medical advice.' at the end."
+    )
+    response_text = await llm_client.generate("gemini-1.5-pro", prompt)
+    if not response_text:
+        raise ValueError("No response from Gemini API for summary")
+    ai_analysis = response_text.strip()
+
+    progress("saving", 70)
+    report_data = {
+        "user_id": user_id,
+        "username": username,
+        "period": period,
+        "analysis": ai_analysis,
+        "timestamp": utcnow(),
+    }
+    report_id = (await run_db(reports_collection.insert_one, report_data)).inserted_id
+    logger.info(f"Report inserted with ID: {report_id}")
+
+    result = {
+        "status": "success",
+        "report_id": str(report_id),
+        "summary": ai_analysis.split("Disclaimer:")[0].strip(),
+        "timestamp": report_data["timestamp"]
+    }
+
+    progress("rendering", 80)
+    if stream:
+        result["pdf"] = await render_report(username, report_id, log_source, ai_analysis, period=period)
+        return result
+
+    pdf_path = f"reports/report_{report_id}.pdf"
+    os.makedirs("reports", exist_ok=True)
+    if not os.access("reports", os.W_OK):
+        raise Exception("No write permission for 'reports' directory")
+    await render_report(username, report_id, log_source, ai_analysis, path=pdf_path, period=period)
+    logger.info(f"PDF generated at: {pdf_path}")
+
+    await run_db(reports_collection.update_one,
+        {"_id": report_id},
+        {"$set": {"pdf_path": pdf_path}}
+    )
+    result["download_url"] = f"/api/download-report/{report_id}"
+    return result
+
+async def run_report_job(job):
+    return await run_report_pipeline(job.user_id, progress=job.update, **job.payload)
+
+report_jobs = ReportJobQueue(run_report_job)
+
 @app.post("/api/reports")
 async def generate_report(
+    response: Response,
     session: dict = Depends(get_session),
     username: str = Form(None),
     logs: List[Dict] = Form(None),
-    image: UploadFile = File(None)
+    image: UploadFile = File(None),
+    background: bool = Form(False),
+    stream: bool = Form(False),
+    start_date: Optional[str] = Form(None),
+    end_date: Optional[str] = Form(None)
 ):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -663,163 +1012,53 @@ async def generate_report(
     try:
         user_id = str(session["_id"])
         username = username or session.get("username", "User")
+        date_bounds = report_date_bounds(start_date, end_date)
+        period = f"{start_date or 'first log'} to {end_date or 'today'}" if date_bounds else None
+        image_bytes = await image.read() if image else None
+        options = {"date_bounds": date_bounds, "period": period}
 
-        logs_data = logs if logs else list(logs_collection.find({"user_id": user_id}, {"_id": 0}))
-        if not logs_data:
-            logs_data = [{"timestamp": str(datetime.now()), "mood": "N/A", "sleep": 0, "water": 0, "exercise": 0, "note": "No logs available"}]
-
-        report_analyses = list(reports_collection.find({"user_id": user_id}, {"_id": 0, "analysis": 1, "timestamp": 1}))
-        analyses_text = "\n".join([f"Analysis from {r['timestamp']}: {r.get('analysis', 'No analysis available')}" for r in report_analyses]) or "No previous analyses available."
-
-        image_analysis = ""
-        if image:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
-                content = await image.read()
-                temp_file.write(content)
-                temp_file_path = temp_file.name
-            logger.info(f"Temporary image file saved at: {temp_file_path}")
-
-            from PIL import Image
-            with Image.open(temp_file_path) as img:
-                model = genai.GenerativeModel("gemini-1.5-pro")
-                prompt = (
-                    "Analyze the provided image for health-related content. Identify any visible medical conditions, injuries, "
-                    "or skin issues with high specificity (e.g., rash, bruise, swelling, cut, burn). Structure the response as follows:\n"
-                    "- **Condition**: [Exact condition or 'Unable to determine' if unclear]\n"
-                    "- **Description**: [Detailed description of the observed issue, including any visible signs or abnormalities]\n"
-                    "- **Possible Diagnosis**: [Specific diagnosis if detectable, e.g., 'Eczema', 'Second-degree burn', or 'N/A']\n"
-                    "- **Suggested Actions**: [Detailed steps, e.g., 'Clean with soap and water, apply antiseptic', 'Seek medical attention']\n"
-                    "- **Medication Suggestions**: [Specific over-the-counter options, e.g., 'Hydrocortisone cream for inflammation', 'N/A']\n"
-                    "Include: 'Disclaimer: Not a substitute for professional medical advice.' at the end."
-                )
-                response = model.generate_content([prompt, img])
-                if not response.text:
-                    raise ValueError("No response from Gemini API for image analysis")
-                image_analysis = response.text.strip()
-            os.unlink(temp_file_path)
-            logger.info(f"Temporary image file deleted: {temp_file_path}")
-
-        model = genai.GenerativeModel("gemini-1.5-pro")
-        prompt = (
-            f"Generate a detailed health report summary for user {username} based on the following data:\n"
-            f"Logs:\n{json.dumps(logs_data, indent=2)}\n"
-            f"Previous Analyses:\n{analyses_text}\n"
-            f"Image Analysis:\n{image_analysis if image_analysis else 'No image analysis available.'}\n"
-            "Structure the response as follows:\n"
-            "- **Condition**: [Overall health condition or 'N/A' if unclear, incorporating image and log data]\n"
-            "- **Description**: [Detailed description based on logs, previous analyses, and image analysis]\n"
-            "- **Possible Diagnosis**: [General diagnosis if detectable, e.g., 'Fatigue', 'Typhoid Fever', or 'N/A']\n"
-            "- **Suggested Actions**: [Comprehensive recommendations based on all data]\n"
-            "- **Medication Suggestions**: [General suggestions based on all data, e.g., 'Multivitamins if deficient', 'N/A']\n"
-            "Include: 'Disclaimer: Not a substitute for professional medical advice.' at the end."
-        )
-        response = model.generate_content(prompt)
-        if not response.text:
-            raise ValueError("No response from Gemini API for summary")
-        ai_analysis = response.text.strip()
-
-        report_data = {
-            "user_id": user_id,
-            "username": username,
-            "logs": logs_data,
-            "analysis": ai_analysis,
-            "timestamp": str(datetime.now()),
-        }
-        report_id = reports_collection.insert_one(report_data).inserted_id
-        logger.info(f"Report inserted with ID: {report_id}")
-
-        pdf_path = f"reports/report_{report_id}.pdf"
-        os.makedirs("reports", exist_ok=True)
-        if not os.access("reports", os.W_OK):
-            raise Exception("No write permission for 'reports' directory")
-
-        doc = SimpleDocTemplate(pdf_path, pagesize=letter)
-        styles = getSampleStyleSheet()
-        heading_style = styles['Heading1']
-        normal_style = styles['Normal']
-        italic_style = styles['Italic']
-
-        content = [
-            Paragraph("HealthChain Medical Report", heading_style),
-            Spacer(1, 20),
-            Paragraph(f"Patient Name: {username}", normal_style),
-            Paragraph(f"Report ID: {report_id}", normal_style),
-            Paragraph(f"Date of Issue: {datetime.now().strftime('%B %d, %Y %H:%M:%S')}", normal_style),
-            Spacer(1, 20),
-            Paragraph("Health Logs", heading_style),
-            Spacer(1, 10),
-        ]
-
-        log_table_data = [["Timestamp", "Mood", "Sleep (hrs)", "Water (L)", "Exercise (min)", "Note"]]
-        for log in logs_data:
-            log_table_data.append([
-                log.get("timestamp", "N/A"),
-                log.get("mood", "N/A").replace("Z", "").strip(),
-                str(log.get("sleep", 0)),
-                str(log.get("water", 0)),
-                str(log.get("exercise", 0)),
-                log.get("note", "N/A")
-            ])
-        table = Table(log_table_data, colWidths=[90, 60, 60, 60, 70, 110])
-        table.setStyle(TableStyle([
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('LEFTPADDING', (0, 0), (-1, -1), 5),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 5),
-            ('TOPPADDING', (0, 0), (-1, -1), 5),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-        ]))
-        content.append(table)
-        content.append(Spacer(1, 20))
-
-        content.append(Paragraph("AI Analysis Report", heading_style))
-        content.append(Spacer(1, 10))
-        for line in ai_analysis.split("\n"):
-            if line.strip():
-                if "Disclaimer" in line:
-                    content.append(Paragraph(line, italic_style))
-                else:
-                    content.append(Paragraph(line, normal_style))
-        content.append(Spacer(1, 20))
-
-        doc.build(content)
-        logger.info(f"PDF generated at: {pdf_path}")
-
-        reports_collection.update_one(
-            {"_id": report_id},
-            {"$set": {"pdf_path": pdf_path}}
-        )
-
-        download_url = f"/api/download-report/{report_id}"
-        return {
-            "status": "success",
-            "report_id": str(report_id),
-            "download_url": download_url,
-            "summary": ai_analysis.split("Disclaimer:")[0].strip(),
-            "timestamp": report_data["timestamp"]
-        }
+        if background:
+            try:
+                job = report_jobs.submit(user_id, username=username, logs=logs, image=image_bytes, **options)
+            except asyncio.QueueFull:
+                raise HTTPException(status_code=503, detail="Report queue is full, please try again shortly")
+            response.status_code = 202
+            return {"status": "queued", "job_id": job.id, "status_url": f"/api/reports/jobs/{job.id}"}
+
+        if stream:
+            result = await run_report_pipeline(user_id, username, logs, image_bytes, stream=True, **options)
+            return StreamingResponse(
+                io.BytesIO(result["pdf"]),
+                media_type="application/pdf",
+                headers={
+                    "Content-Disposition": f"attachment; filename=report_{result['report_id']}.pdf",
+                    "X-Report-Id": result["report_id"]
+                }
+            )
 
+        return await run_report_pipeline(user_id, username, logs, image_bytes, **options)
     except HTTPException as http_err:
         logger.error(f"HTTP error in generate_report: {str(http_err)}", exc_info=True)
         raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Report generation timed out waiting for the AI service")
     except Exception as e:
         logger.error(f"Failed to generate report: {str(e)}", exc_info=True)
-        try:
-            if 'temp_file_path' in locals():
-                os.unlink(temp_file_path)
-                logger.info(f"Cleaned up temporary file: {temp_file_path}")
-        except Exception as cleanup_err:
-            logger.warning(f"Failed to clean up temporary file: {str(cleanup_err)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.get("/api/reports/jobs/{job_id}")
+async def get_report_job(job_id: str, session: dict = Depends(get_session)):
+    if not session:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    job = report_jobs.get(job_id)
+    if not job or job.user_id != str(session["_id"]):
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return job.to_dict()
+
 @app.get("/api/download-report/{report_id}")
 async def download_report(report_id: str):
     try:
-        report = reports_collection.find_one({"_id": ObjectId(report_id)})
+        report = await run_db(reports_collection.find_one, {"_id": ObjectId(report_id)})
         if not report or "pdf_path" not in report:
             raise HTTPException(status_code=404, detail="Report not found")
         
@@ -833,15 +1072,20 @@ async def download_report(report_id: str):
         raise HTTPException(status_code=500, detail="Failed to download report")
 
 @app.get("/api/reports")
-async def get_reports(session: dict = Depends(get_session)):
+async def get_reports(response: Response, page: PageParams = Depends(), session: dict = Depends(get_session)):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
-        reports = list(reports_collection.find({"user_id": str(session["_id"])}))
-        for report in reports:
-            report["_id"] = str(report["_id"])
+        # The embedded log snapshot dominates report size, so it is only returned on request (fields=logs).
+        reports, next_cursor = await fetch_page(
+            reports_collection, {"user_id": str(session["_id"])}, page, REPORT_FIELDS,
+            include_id=True, default_exclude=("logs",)
+        )
+        set_cursor_header(response, next_cursor)
         logger.info(f"Retrieved {len(reports)} reports for user {session['username']}")
         return reports
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching reports: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch reports")
@@ -860,7 +1104,6 @@ async def analyze_report(file: UploadFile = File(...), session: dict = Depends(g
 
         from PIL import Image
         with Image.open(temp_file_path) as image:
-            model = genai.GenerativeModel("gemini-1.5-pro")
             prompt = (
                 "Analyze the provided image for health-related content. Identify any visible medical conditions, injuries, "
                 "or skin issues with high specificity (e.g., rash, bruise, swelling, cut, burn). Structure the response as follows:\n"
@@ -872,16 +1115,16 @@ async def analyze_report(file: UploadFile = File(...), session: dict = Depends(g
                 "Include: 'Disclaimer: Not a substitute for professional medical advice.' at the end."
             )
             logger.info("Sending image and prompt to Gemini API")
-            response = model.generate_content([prompt, image])
+            response_text = await llm_client.generate("gemini-1.5-pro", [prompt, image])
             logger.info("Received response from Gemini API")
-            if not response.text:
+            if not response_text:
                 logger.error("Empty response from Gemini AI")
                 raise ValueError("No response from Gemini API")
 
         analysis = {
             "filename": file.filename,
             "extracted_text": "N/A (Image-based analysis)",
-            "ai_analysis": response.text
+            "ai_analysis": response_text
         }
 
         os.unlink(temp_file_path)
@@ -900,6 +1143,8 @@ async def analyze_report(file: UploadFile = File(...), session: dict = Depends(g
                 logger.info(f"Cleaned up temporary file: {temp_file_path}")
         except Exception as cleanup_err:
             logger.warning(f"Failed to clean up temporary file: {str(cleanup_err)}")
+        if isinstance(e, asyncio.TimeoutError):
+            raise HTTPException(status_code=504, detail="Image analysis timed out, please try again")
         raise HTTPException(status_code=500, detail=f"Error analyzing file: {str(e)}")
 
 # --- Forum Endpoints ---
@@ -910,7 +1155,8 @@ async def add_forum_post(post: ForumPost, session: dict = Depends(get_session)):
     try:
         post_dict = post.dict()
         post_dict["user_id"] = str(session["_id"])
-        post_id = forum_collection.insert_one(post_dict).inserted_id
+        post_dict["timestamp"] = entry_timestamp(post_dict.get("timestamp"))
+        post_id = (await run_db(forum_collection.insert_one, post_dict)).inserted_id
         logger.info(f"Forum post added with ID {post_id}")
         return {"status": "success", "post_id": str(post_id)}
     except Exception as e:
@@ -918,13 +1164,16 @@ async def add_forum_post(post: ForumPost, session: dict = Depends(get_session)):
         raise HTTPException(status_code=500, detail="Database error")
 
 @app.get("/api/forum")
-async def get_forum_posts(session: dict = Depends(get_session)):
+async def get_forum_posts(response: Response, page: PageParams = Depends(), session: dict = Depends(get_session)):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
-        posts = list(forum_collection.find({}, {'_id': 0}))
+        posts, next_cursor = await fetch_page(forum_collection, {}, page, FORUM_FIELDS)
+        set_cursor_header(response, next_cursor)
         logger.info(f"Retrieved {len(posts)} forum posts")
         return posts
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch forum posts: {str(e)}")
         raise HTTPException(status_code=500, detail="Database error")
@@ -937,7 +1186,8 @@ async def add_nutrition(nutrition: NutritionInput, session: dict = Depends(get_s
     try:
         nutrition_dict = nutrition.dict()
         nutrition_dict["user_id"] = str(session["_id"])
-        nutrition_id = nutrition_collection.insert_one(nutrition_dict).inserted_id
+        nutrition_dict["timestamp"] = entry_timestamp(nutrition_dict.get("timestamp"))
+        nutrition_id = (await run_db(nutrition_collection.insert_one, nutrition_dict)).inserted_id
         logger.info(f"Nutrition entry added with ID {nutrition_id}")
         return {
             "status": "success",
@@ -948,42 +1198,101 @@ async def add_nutrition(nutrition: NutritionInput, session: dict = Depends(get_s
         logger.error(f"Failed to add nutrition: {str(e)}")
         raise HTTPException(status_code=500, detail="Database error")
 
+@app.post("/api/nutrition/batch")
+async def add_nutrition_batch(request: Request, session: dict = Depends(get_session)):
+    if not session:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    items = await read_batch(request)
+    user_id = str(session["_id"])
+    valid, results = validate_batch(items, NutritionInput)
+    try:
+        docs = [(index, {**entry.dict(), "user_id": user_id, "timestamp": entry_timestamp(entry.timestamp)}) for index, entry in valid]
+        inserted = await run_db(insert_batch, nutrition_collection, docs, results)
+        logger.info(f"Batch of {len(items)} nutrition entries: {len(inserted)} inserted")
+        return batch_summary(results)
+    except Exception as e:
+        logger.error(f"Failed to add nutrition batch: {str(e)}")
+        raise HTTPException(status_code=500, detail="Database error")
+
+NUTRIENT_TOTALS = {field: {"$sum": f"${field}"} for field in NUTRIENT_FIELDS}
+
+async def nutrition_totals(user_id, start, end):
+    """Macro totals for [start, end), summed in Mongo over the (user_id, timestamp) index."""
+    docs = await aggregate_all(nutrition_collection, [
+        {"$match": {"user_id": user_id, "timestamp": {"$gte": start, "$lt": end}}},
+        {"$group": {"_id": None, **NUTRIENT_TOTALS}},
+    ])
+    return {field: docs[0][field] if docs else 0 for field in NUTRIENT_FIELDS}
+
+async def nutrition_daily_totals(user_id, days):
+    """Macro totals per server-local day for the last ``days`` days, oldest first.
+
+    Day boundaries come from local_day_bounds so $bucket splits on the same calendar
+    as the "today" summary, DST changes included.
+    """
+    today = datetime.now().date()
+    dates = [today - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+    boundaries = [local_day_bounds(day)[0] for day in dates] + [local_day_bounds(today)[1]]
+    docs = await aggregate_all(nutrition_collection, [
+        {"$match": {"user_id": user_id, "timestamp": {"$gte": boundaries[0], "$lt": boundaries[-1]}}},
+        {"$bucket": {"groupBy": "$timestamp", "boundaries": boundaries, "output": {**NUTRIENT_TOTALS, "count": {"$sum": 1}}}},
+    ])
+    by_start = {doc["_id"]: doc for doc in docs}
+    daily = []
+    for day, start in zip(dates, boundaries):
+        doc = by_start.get(start, {})
+        daily.append({"date": day.isoformat(), "count": doc.get("count", 0), **{field: doc.get(field, 0) for field in NUTRIENT_FIELDS}})
+    return daily
+
 @app.get("/api/nutrition")
-async def get_nutrition(session: dict = Depends(get_session)):
+async def get_nutrition(
+    response: Response,
+    page: PageParams = Depends(),
+    days: Optional[int] = Query(None, ge=1, le=366, description="Also return per-day macro totals for the last N days"),
+    session: dict = Depends(get_session)
+):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
-        nutrition_data = list(nutrition_collection.find({"user_id": str(session["_id"])}, {'_id': 0}))
-        today = datetime.now().date().isoformat()
-        today_entries = [n for n in nutrition_data if n['timestamp'].startswith(today)]
-        summary = {"calories": 0, "protein": 0, "fats": 0, "carbs": 0}
-        for item in today_entries:
-            summary["calories"] += item["calories"]
-            summary["protein"] += item["protein"]
-            summary["fats"] += item["fats"]
-            summary["carbs"] += item["carbs"]
+        user_id = str(session["_id"])
+        entries, next_cursor = await fetch_page(nutrition_collection, {"user_id": user_id}, page, NUTRITION_FIELDS)
+        set_cursor_header(response, next_cursor)
+        summary = await nutrition_totals(user_id, *local_day_bounds())
         suggestion = "You're on track!" if summary["calories"] < 2500 else "Consider reducing calorie intake today."
-        return {
-            "entries": nutrition_data,
+        result = {
+            "entries": entries,
             "today_summary": {**summary, "suggestion": suggestion}
         }
+        if days:
+            result["daily"] = await nutrition_daily_totals(user_id, days)
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch nutrition: {str(e)}")
         raise HTTPException(status_code=500, detail="Database error")
 
+nutrition_cache = NutritionCache(nutrition_cache_collection)
+
 @app.post("/api/nutrition/fetch")
-async def fetch_nutrients(nutrition: FetchNutritionInput, session: dict = Depends(get_session)):
+async def fetch_nutrients(nutrition: FetchNutritionInput, response: Response, session: dict = Depends(get_session)):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
+    nutrient_text = ""
     try:
         food_item = nutrition.food_item.strip()
         if not food_item:
             raise HTTPException(status_code=400, detail="Food item is required")
 
-        model = genai.GenerativeModel("gemini-1.5-pro")
+        cached, tier = await nutrition_cache.get(food_item)
+        if cached is not None:
+            response.headers["X-Cache"] = "HIT"
+            response.headers["X-Cache-Tier"] = tier
+            return {"status": "success", **cached}
+
         prompt = f"Provide nutritional information for {food_item} in the following format: 'calories: X, protein: Y g, fats: Z g, carbs: W g' where X, Y, Z, W are approximate values in numerical form. Respond only with the formatted string. If unable to provide data, return 'error: no data available'."
-        response = model.generate_content(prompt)
-        nutrient_text = response.text.strip()
+        response_text = await llm_client.generate("gemini-1.5-pro", prompt)
+        nutrient_text = response_text.strip()
 
         if nutrient_text.startswith("error:"):
             raise HTTPException(status_code=400, detail=nutrient_text.replace("error: ", ""))
@@ -1008,6 +1317,8 @@ async def fetch_nutrients(nutrition: FetchNutritionInput, session: dict = Depend
         required_nutrients = {"calories", "protein", "fats", "carbs"}
         for nutrient in required_nutrients:
             nutrients.setdefault(nutrient, 0.0)
+        await nutrition_cache.set(food_item, nutrients)
+        response.headers["X-Cache"] = "MISS"
 
         return {
             "status": "success",
@@ -1016,6 +1327,8 @@ async def fetch_nutrients(nutrition: FetchNutritionInput, session: dict = Depend
             "fats": nutrients.get("fats", 0),
             "carbs": nutrients.get("carbs", 0)
         }
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Gemini API timed out. Please try again later.")
     except google_exceptions.GoogleAPIError as e:
         logger.error(f"Gemini API error: {str(e)}")
         raise HTTPException(status_code=500, detail="Gemini API is currently unavailable. Please try again later.")
@@ -1027,6 +1340,11 @@ async def fetch_nutrients(nutrition: FetchNutritionInput, session: dict = Depend
         raise HTTPException(status_code=500, detail="Failed to fetch nutrients from AI")
 
 # --- Fitness Endpoints ---
+def fitness_limits_error(duration: int, intensity: int):
+    if duration <= 0 or not 1 <= intensity <= 10:
+        return "Invalid input: duration must be positive and intensity 1-10"
+    return None
+
 @app.post("/api/fitness")
 async def add_fitness(
     session: dict = Depends(get_session),
@@ -1039,32 +1357,64 @@ async def add_fitness(
 ):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
+    error = fitness_limits_error(duration, intensity)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
     try:
         fitness_data = {
             "exercise_name": exercise_name,
             "duration": duration,
             "intensity": intensity,
-            "timestamp": str(datetime.now()),
+            "timestamp": utcnow(),
             "user_id": str(session["_id"]),
             "weight": weight,
             "goal": goal,
             "fitness_level": fitness_level
         }
-        fitness_id = fitness_collection.insert_one(fitness_data).inserted_id
+        fitness_id = (await run_db(fitness_collection.insert_one, fitness_data)).inserted_id
         logger.info(f"Fitness entry added with ID {fitness_id}")
+        try:
+            await run_db(fitness_rollups.apply_entries, fitness_weekly_collection, fitness_data["user_id"], [fitness_data])
+        except Exception as e:
+            # The entry itself is stored; a missed rollup update is repaired by the rebuild command.
+            logger.warning(f"Failed to update fitness rollups for entry {fitness_id}: {str(e)}")
         return {"status": "success", "fitness_id": str(fitness_id)}
     except Exception as e:
         logger.error(f"Failed to add fitness: {str(e)}")
         raise HTTPException(status_code=500, detail="Database error")
 
+@app.post("/api/fitness/batch")
+async def add_fitness_batch(request: Request, session: dict = Depends(get_session)):
+    if not session:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    items = await read_batch(request)
+    user_id = str(session["_id"])
+    valid, results = validate_batch(items, FitnessInput, lambda entry: fitness_limits_error(entry.duration, entry.intensity))
+    try:
+        docs = [(index, {**entry.dict(), "user_id": user_id, "timestamp": entry_timestamp(entry.timestamp)}) for index, entry in valid]
+        inserted = await run_db(insert_batch, fitness_collection, docs, results)
+        logger.info(f"Batch of {len(items)} fitness entries: {len(inserted)} inserted")
+        if inserted:
+            try:
+                await run_db(fitness_rollups.apply_entries, fitness_weekly_collection, user_id, inserted)
+            except Exception as e:
+                logger.warning(f"Failed to update fitness rollups for batch: {str(e)}")
+        return batch_summary(results)
+    except Exception as e:
+        logger.error(f"Failed to add fitness batch: {str(e)}")
+        raise HTTPException(status_code=500, detail="Database error")
+
 @app.get("/api/fitness")
-async def get_fitness(session: dict = Depends(get_session)):
+async def get_fitness(response: Response, page: PageParams = Depends(), session: dict = Depends(get_session)):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
-        fitness_data = list(fitness_collection.find({"user_id": str(session["_id"])}, {'_id': 0}))
+        fitness_data, next_cursor = await fetch_page(fitness_collection, {"user_id": str(session["_id"])}, page, FITNESS_FIELDS)
+        set_cursor_header(response, next_cursor)
         logger.info(f"Retrieved {len(fitness_data)} fitness entries")
         return fitness_data
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch fitness: {str(e)}")
         raise HTTPException(status_code=500, detail="Database error")
@@ -1074,7 +1424,7 @@ async def get_fitness_plan(session: dict = Depends(get_session)):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
-        latest_fitness = fitness_collection.find_one({"user_id": str(session["_id"])}, sort=[("timestamp", -1)])
+        latest_fitness = await run_db(fitness_collection.find_one, {"user_id": str(session["_id"])}, sort=[("timestamp", -1)])
         if not latest_fitness or not latest_fitness.get("fitness_level") or not latest_fitness.get("goal"):
             return {"status": "info", "message": "Please log a fitness session with goal and fitness level first."}
 
@@ -1083,10 +1433,9 @@ async def get_fitness_plan(session: dict = Depends(get_session)):
         fitness_level = latest_fitness.get("fitness_level", "beginner")
         duration = latest_fitness.get("duration", 30)
         
-        today = datetime.now().date().isoformat()
-        nutrition_data = list(nutrition_collection.find({"user_id": str(session["_id"]), "timestamp": {"$regex": f"^{today}"}}))
-        total_calories = sum(n["calories"] for n in nutrition_data) if nutrition_data else 0
-        total_protein = sum(n["protein"] for n in nutrition_data) if nutrition_data else 0
+        today_totals = await nutrition_totals(str(session["_id"]), *local_day_bounds())
+        total_calories = today_totals["calories"]
+        total_protein = today_totals["protein"]
 
         calorie_threshold = 2000
         if total_calories > calorie_threshold:
@@ -1101,25 +1450,22 @@ async def get_fitness_plan(session: dict = Depends(get_session)):
 
         if goal == "lose weight":
             if fitness_level == "beginner":
-                suggestion = f"30 minutes of brisk walking{suggestion_modifier}"
-                calories = (3.0 * duration * weight * intensity_factor) / 60
+                activity, suggestion = "walking", f"30 minutes of brisk walking{suggestion_modifier}"
             elif fitness_level == "intermediate":
-                suggestion = f"20 minutes of jogging{suggestion_modifier}"
-                calories = (7.0 * duration * weight * intensity_factor) / 60
+                activity, suggestion = "jogging", f"20 minutes of jogging{suggestion_modifier}"
             else:
-                suggestion = f"15 minutes of HIIT{suggestion_modifier}"
-                calories = (8.0 * duration * weight * intensity_factor) / 60
+                activity, suggestion = "hiit", f"15 minutes of HIIT{suggestion_modifier}"
         elif goal == "gain muscle":
+            activity = "weightlifting"
             suggestion = f"30 minutes of weightlifting{suggestion_modifier} (ensure {total_protein*2.2:.0f}g protein intake)"
-            calories = (5.0 * duration * weight * intensity_factor) / 60
         else:
-            suggestion = f"30 minutes of mixed cardio and strength{suggestion_modifier}"
-            calories = (4.0 * duration * weight * intensity_factor) / 60
+            activity, suggestion = "circuit training", f"30 minutes of mixed cardio and strength{suggestion_modifier}"
+        estimated_calories = calories.estimate_one(activity, duration, weight) * intensity_factor
 
         return {
             "status": "success",
             "workout_suggestion": suggestion,
-            "estimated_calories_burned": round(calories, 1),
+            "estimated_calories_burned": round(estimated_calories, 1),
             "weight": weight,
             "goal": goal,
             "fitness_level": fitness_level,
@@ -1129,51 +1475,38 @@ async def get_fitness_plan(session: dict = Depends(get_session)):
         logger.error(f"Failed to generate fitness plan: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to generate fitness plan")
 
+ESTIMATE_MAX_SESSIONS = int(os.getenv("ESTIMATE_MAX_SESSIONS", "10000"))
+
+@app.post("/api/fitness/estimate")
+async def estimate_fitness_calories(request: EstimateRequest, session: dict = Depends(get_session)):
+    if not session:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if len(request.sessions) > ESTIMATE_MAX_SESSIONS:
+        raise HTTPException(status_code=400, detail=f"At most {ESTIMATE_MAX_SESSIONS} sessions per request")
+    try:
+        sessions = request.sessions
+        estimates = calories.estimate_calories(
+            [s.exercise_name for s in sessions],
+            [s.duration for s in sessions],
+            [s.weight for s in sessions],
+            [s.intensity for s in sessions]
+        )
+        return {
+            "status": "success",
+            "estimates": [round(value, 1) for value in estimates.tolist()],
+            "total_calories": round(float(estimates.sum()), 1)
+        }
+    except Exception as e:
+        logger.error(f"Failed to estimate calories: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to estimate calories")
+
 @app.get("/api/fitness/progress", response_model=ProgressResponse)
 async def get_fitness_progress(session: dict = Depends(get_session)):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
     
     try:
-        user_id = str(session["_id"])
-        client = MongoClient("mongodb://localhost:27017/")
-        db = client["healthchain"]
-        fitness_collection = db.fitness
-
-        pipeline = [
-            {"$match": {"user_id": user_id}},
-            {
-                "$group": {
-                    "_id": {
-                        "$dateToString": {"format": "%Y-W%V", "date": "$timestamp"}
-                    },
-                    "total_duration": {"$sum": "$duration"},
-                    "total_intensity": {"$sum": "$intensity"},
-                    "total_weighted_calories": {
-                        "$sum": {
-                            "$multiply": [
-                                {"$switch": {
-                                    "branches": [
-                                        {"case": {"$eq": ["$exercise_name", "walking"]}, "then": 3.0},
-                                        {"case": {"$eq": ["$exercise_name", "jogging"]}, "then": 7.0},
-                                        {"case": {"$eq": ["$exercise_name", "HIIT"]}, "then": 8.0},
-                                        {"case": {"$eq": ["$exercise_name", "weightlifting"]}, "then": 5.0},
-                                        {"case": True, "then": 3.0}
-                                    ],
-                                    "default": 3.0
-                                }},
-                                "$duration",
-                                {"$ifNull": ["$weight", 70]}
-                            ]
-                        }
-                    },
-                    "count": {"$sum": 1}
-                }
-            },
-            {"$sort": {"_id": -1}}
-        ]
-
-        progress_data = list(fitness_collection.aggregate(pipeline))
+        progress_data = await run_db(fitness_rollups.recent_weeks, fitness_weekly_collection, str(session["_id"]))
         if not progress_data:
             return ProgressResponse(
                 weekly_calories=[],
@@ -1182,8 +1515,8 @@ async def get_fitness_progress(session: dict = Depends(get_session)):
             )
 
         weekly_calories = [
-            WeeklyCalories(week=doc["_id"], calories=doc["total_weighted_calories"] / 60)
-            for doc in progress_data[:4]
+            WeeklyCalories(week=doc["week"], calories=doc["total_weighted_calories"] / 60)
+            for doc in progress_data
         ]
         current_week = progress_data[0]
         previous_week = progress_data[1] if len(progress_data) > 1 else None
@@ -1225,6 +1558,45 @@ async def get_fitness_progress(session: dict = Depends(get_session)):
         raise HTTPException(status_code=500, detail="Failed to retrieve progress data")
 
 # --- Medication Endpoints ---
+medicine_index = MedicineIndex.from_file()
+medicine_verdicts = TTLCache(maxsize=10000, ttl=7 * 24 * 3600)
+
+async def check_medicine_name(name: str):
+    """Return (is_valid, reason, source); the LLM is only asked about names the local index misses."""
+    if medicine_index.lookup(name):
+        return True, None, "index"
+    key = normalize_medicine_name(name)
+    verdict = medicine_verdicts.get(key)
+    if verdict is not None:
+        return (*verdict, "memo")
+    prompt = (
+        f"Verify if the medicine name '{name}' is valid. Return ONLY a JSON object with the following structure:\n"
+        "{\n"
+        "  \"is_valid\": true|false,\n"
+        "  \"reason\": \"string (optional, only if is_valid is false)\"\n"
+        "}\n"
+        "Set 'is_valid' to true if the medicine name exists or it is a medicine brand name. "
+        "Set 'is_valid' to false for any non-medicine terms or any other material than medicine (e.g., 'drive', 'apple', 'pipe', 'car', 'pen'). "
+        "If invalid, provide a reason in the 'reason' field (e.g., 'Not a recognized medicine')."
+    )
+    response_text = await llm_client.generate("gemini-1.5-flash", prompt, generation_config={"response_mime_type": "application/json"})
+    if not response_text:
+        logger.error("Empty response from Gemini API")
+        raise ValueError("No response from Gemini API")
+
+    logger.info(f"Raw response: {response_text}")
+    try:
+        result = json.loads(response_text.strip())
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decode error: {str(e)}, Raw response: {response_text}")
+        return False, "Invalid response format from Gemini", "llm"
+    if "is_valid" not in result or not isinstance(result["is_valid"], bool):
+        raise ValueError("Invalid response structure: 'is_valid' must be a boolean")
+    is_valid = result["is_valid"]
+    reason = result.get("reason", "Medicine name not recognized") if not is_valid else None
+    medicine_verdicts.set(key, (is_valid, reason))
+    return is_valid, reason, "llm"
+
 @app.post("/api/meds")
 async def add_med(
     session: dict = Depends(get_session),
@@ -1237,25 +1609,26 @@ async def add_med(
     try:
         name = name.lower().strip()
         logger.info(f"Validating medicine: {name}")
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        prompt = f"Is '{name}' a recognized medicine or pharmaceutical drug? Respond with 'yes' or 'no' only."
-        logger.info(f"Sending prompt to Gemini API: {prompt}")
-        response = model.generate_content(prompt)
-        logger.info(f"Gemini API response: {response.text}")
-        if "no" in response.text.lower():
+        is_valid, _, source = await check_medicine_name(name)
+        logger.info(f"Medicine '{name}' valid={is_valid} (source: {source})")
+        if not is_valid:
             raise HTTPException(status_code=400, detail=f"'{name}' is not a recognized medicine. Only approved medicines are allowed.")
 
         med_data = {
             "name": name,
             "time": time,
             "dosage": dosage,
-            "timestamp": str(datetime.now()),
+            "timestamp": utcnow(),
             "user_id": str(session["_id"])
         }
-        med_id = meds_collection.insert_one(med_data).inserted_id
+        med_id = (await run_db(meds_collection.insert_one, med_data)).inserted_id
         logger.info(f"Medication added with ID {med_id}")
         return {"status": "success", "med_id": str(med_id)}
-    except genai.exceptions.GenerativeAIError as e:
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Medicine validation timed out, please try again")
+    except google_exceptions.GoogleAPIError as e:
         logger.error(f"Gemini API error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Gemini API validation failed: {str(e)}")
     except Exception as e:
@@ -1263,13 +1636,16 @@ async def add_med(
         raise HTTPException(status_code=500, detail="Database error or medicine validation failed")
 
 @app.get("/api/meds")
-async def get_meds(session: dict = Depends(get_session)):
+async def get_meds(response: Response, page: PageParams = Depends(), session: dict = Depends(get_session)):
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
-        meds = list(meds_collection.find({"user_id": str(session["_id"])}, {'_id': 0}))
+        meds, next_cursor = await fetch_page(meds_collection, {"user_id": str(session["_id"])}, page, MED_FIELDS)
+        set_cursor_header(response, next_cursor)
         logger.info(f"Retrieved {len(meds)} medications")
         return meds
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch medications: {str(e)}")
         raise HTTPException(status_code=500, detail="Database error")
@@ -1279,40 +1655,81 @@ async def verify_medicine(medicine: MedicineVerification, session: dict = Depend
     if not session:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        prompt = (
-            "Verify if the provided medicine name is valid. Return ONLY a JSON object with the following structure:\n"
-            "{\n"
-            "  \"is_valid\": true|false,\n"
-            "  \"reason\": \"string (optional, only if is_valid is false)\"\n"
-            "}\n"
-            "Set 'is_valid' to true if the medicine name exists or it is a medicine brand name. "
-            "Set 'is_valid' to false for any non-medicine terms or any other material than medicine (e.g., 'drive', 'apple', 'pipe', 'car', 'pen'). "
-            "If invalid, provide a reason in the 'reason' field (e.g., 'Not a recognized medicine')."
-        )
-        response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-        if not response.text:
-            logger.error("Empty response from Gemini API")
-            raise ValueError("No response from Gemini API")
-        
-        logger.info(f"Raw response: {response.text}")
-        import json
-        try:
-            result = json.loads(response.text.strip())
-            if "is_valid" not in result or not isinstance(result["is_valid"], bool):
-                raise ValueError("Invalid response structure: 'is_valid' must be a boolean")
-            is_valid = result["is_valid"]
-            reason = result.get("reason", "Medicine name not recognized") if not is_valid else None
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error: {str(e)}, Raw response: {response.text}")
-            is_valid = False
-            reason = "Invalid response format from Gemini"
-
-        return {"is_valid": is_valid, "reason": reason}
+        is_valid, reason, source = await check_medicine_name(medicine.medicine_name)
+        return {"is_valid": is_valid, "reason": reason, "source": source}
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Medicine verification timed out, please try again")
     except Exception as e:
         logger.error(f"Medicine verification error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to verify medicine")
 
+# --- Export Endpoints ---
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+EXPORT_COLLECTIONS = {
+    "logs": logs_collection,
+    "fitness": fitness_collection,
+    "nutrition": nutrition_collection,
+    "meds": meds_collection,
+    "reports": reports_collection,
+}
+
+def export_default(value):
+    # Datetimes go out as ISO-8601, the same as the JSON API, so exported rows parse back
+    # through parse_timestamp; str() would use a space separator.
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def export_lines(user_id, names):
+    for name in names:
+        cursor = EXPORT_COLLECTIONS[name].find({"user_id": user_id}, batch_size=EXPORT_BATCH_SIZE).sort("_id", 1)
+        for doc in cursor:
+            doc["_id"] = str(doc["_id"])
+            yield json.dumps({"collection": name, **doc}, default=export_default) + "\n"
+
+def export_chunks(lines, compress=False):
+    # Lines are coalesced into ~64KB chunks (gzip-compressed on the fly if requested) so
+    # memory stays constant no matter how many documents are exported.
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= EXPORT_CHUNK_BYTES:
+            chunk = b"".join(buffer)
+            buffer, size = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = b"".join(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+@app.get("/api/export")
+async def export_data(
+    collections: str = Query("logs,fitness,nutrition"),
+    gzip: bool = Query(False),
+    session: dict = Depends(get_session)
+):
+    if not session:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    names = [name.strip() for name in collections.split(",") if name.strip()]
+    unknown = [name for name in names if name not in EXPORT_COLLECTIONS]
+    if not names or unknown:
+        raise HTTPException(status_code=400, detail=f"collections must be a comma-separated subset of: {', '.join(EXPORT_COLLECTIONS)}")
+    user_id = str(session["_id"])
+    logger.info(f"Export of {names} started for user {session['username']}")
+    headers = {"Content-Disposition": f"attachment; filename=healthchain_export_{user_id}.ndjson"}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    # A sync generator is iterated in Starlette's threadpool, so cursor reads don't block the loop.
+    return StreamingResponse(export_chunks(export_lines(user_id, names), gzip), media_type="application/x-ndjson", headers=headers)
+
 # --- Health Check and Root Endpoints ---
 @app.get("/health")
 async def health_check():
@@ -1327,11 +1744,19 @@ async def root():
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting HealthChain API")
+    report_jobs.start()
+    email_outbox.start()
+    await run_db(ensure_indexes, db)
+    await run_db(nutrition_cache.warm)
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down HealthChain API")
-    client.close()
+    await report_jobs.stop()
+    await email_outbox.stop()
+    report_renderer.shutdown()
+    ledger.shutdown()
+    database.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,68 @@
+import difflib
+import logging
+import os
+import re
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+MEDICINE_LIST_FILE = os.getenv("MEDICINE_LIST_FILE", os.path.join("data", "medicines.txt"))
+
+_STRENGTH = re.compile(r"\b\d+(?:\.\d+)?\s*(?:mg|mcg|g|ml|iu|%)?(?=\s|$)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_medicine_name(name):
+    """Lower-case, drop strength tokens such as "500mg", "10 ml" or "650", collapse whitespace."""
+    name = _STRENGTH.sub(" ", name.lower())
+    return _WHITESPACE.sub(" ", name).strip()
+
+
+class MedicineIndex:
+    """Sorted, de-duplicated tuple of known drug and brand names.
+
+    Exact and prefix lookups are binary searches; fuzzy lookups only compare against
+    names sharing the query's first two characters, which keeps them in the microsecond
+    range for typo tolerance ("amoxicilin", "paracetmol").
+    """
+
+    def __init__(self, names=()):
+        self.names = tuple(sorted({normalize_medicine_name(n) for n in names if n.strip()}))
+
+    @classmethod
+    def from_file(cls, path=MEDICINE_LIST_FILE):
+        if not os.path.exists(path):
+            logger.warning(f"Medicine list not found at {path}; index is empty")
+            return cls()
+        with open(path) as f:
+            index = cls(line for line in f if not line.startswith("#"))
+        logger.info(f"Loaded {len(index.names)} medicine names from {path}")
+        return index
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        name = normalize_medicine_name(name)
+        i = bisect_left(self.names, name)
+        return i < len(self.names) and self.names[i] == name
+
+    def with_prefix(self, prefix, limit=10):
+        prefix = normalize_medicine_name(prefix)
+        i = bisect_left(self.names, prefix)
+        matches = []
+        while i < len(self.names) and self.names[i].startswith(prefix) and len(matches) < limit:
+            matches.append(self.names[i])
+            i += 1
+        return matches
+
+    def lookup(self, name, cutoff=0.85):
+        """Return the matching known name, or None when the index cannot vouch for it."""
+        name = normalize_medicine_name(name)
+        if not name:
+            return None
+        if name in self:
+            return name
+        candidates = self.with_prefix(name[:2], limit=len(self.names))
+        matches = difflib.get_close_matches(name, candidates, n=1, cutoff=cutoff)
+        return matches[0] if matches else None
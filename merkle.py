@@ -0,0 +1,59 @@
+import hashlib
+
+# Leaves and interior nodes are hashed with different prefixes so a leaf can never be
+# passed off as a subtree. An odd node at the end of a level is promoted unchanged
+# rather than paired with itself, which would let two different leaf lists share a root.
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+def leaf_hash(block_hash):
+    return hashlib.sha256(LEAF_PREFIX + bytes.fromhex(block_hash)).digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def _next_level(level):
+    parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2:
+        parents.append(level[-1])
+    return parents
+
+
+def merkle_root(block_hashes):
+    """Hex root over a non-empty list of hex block hashes."""
+    level = [leaf_hash(h) for h in block_hashes]
+    if not level:
+        raise ValueError("Cannot build a Merkle tree with no leaves")
+    while len(level) > 1:
+        level = _next_level(level)
+    return level[0].hex()
+
+
+def merkle_proof(block_hashes, position):
+    """Audit path for the leaf at ``position``: sibling hashes from the leaf up to the root.
+
+    Each step is ``{"hash": hex, "side": "left"|"right"}`` giving where the sibling sits.
+    Promoted odd nodes have no sibling on that level and contribute no step.
+    """
+    level = [leaf_hash(h) for h in block_hashes]
+    if not 0 <= position < len(level):
+        raise IndexError(f"Leaf {position} is outside a tree of {len(level)} leaves")
+    path = []
+    while len(level) > 1:
+        sibling = position ^ 1
+        if sibling < len(level):
+            path.append({"hash": level[sibling].hex(), "side": "left" if sibling < position else "right"})
+        level = _next_level(level)
+        position //= 2
+    return path
+
+
+def verify_proof(block_hash, proof, root):
+    node = leaf_hash(block_hash)
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        node = node_hash(sibling, node) if step["side"] == "left" else node_hash(node, sibling)
+    return node.hex() == root
@@ -0,0 +1,77 @@
+import argparse
+import logging
+
+from pymongo import UpdateOne
+
+from timestamps import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = 1000
+
+# (collection name, fields that used to be written as ISO / str(datetime) strings)
+TIMESTAMP_FIELDS = [
+    ("health_logs", ("timestamp",)),
+    ("nutrition", ("timestamp",)),
+    ("fitness", ("timestamp",)),
+    ("medications", ("timestamp",)),
+    ("forum", ("timestamp",)),
+    ("reports", ("timestamp",)),
+    ("appointments", ("requested_at", "accepted_at")),
+    ("users", ("session_expiry",)),
+    ("doctors", ("session_expiry",)),
+]
+
+
+def migrate_field(collection, field, batch_size=MIGRATION_BATCH_SIZE, dry_run=False):
+    """Rewrite string values of ``field`` as BSON dates, walking ``_id`` in batches.
+
+    Unparseable values are logged and left untouched; re-running is safe because only
+    documents that still hold a string are selected.
+    """
+    converted = skipped = 0
+    last_id = None
+    while True:
+        query = {field: {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = list(collection.find(query, {field: 1}).sort("_id", 1).limit(batch_size))
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+
+        operations = []
+        for doc in docs:
+            try:
+                value = parse_timestamp(doc[field])
+            except ValueError:
+                logger.warning(f"Skipping {collection.name} {doc['_id']}: unparseable {field} {doc[field]!r}")
+                skipped += 1
+                continue
+            operations.append(UpdateOne({"_id": doc["_id"], field: doc[field]}, {"$set": {field: value}}))
+        if operations and not dry_run:
+            collection.bulk_write(operations, ordered=False)
+        converted += len(operations)
+        logger.info(f"{collection.name}.{field}: {converted} converted, {skipped} skipped so far")
+    return converted, skipped
+
+
+def migrate(db, batch_size=MIGRATION_BATCH_SIZE, dry_run=False):
+    totals = {}
+    for collection_name, fields in TIMESTAMP_FIELDS:
+        for field in fields:
+            totals[f"{collection_name}.{field}"] = migrate_field(db[collection_name], field, batch_size, dry_run)
+    for name, (converted, skipped) in totals.items():
+        logger.info(f"{name}: {converted} converted, {skipped} skipped")
+    return totals
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Convert legacy string timestamps to BSON dates")
+    parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    args = parser.parse_args()
+
+    from database import db
+    migrate(db, batch_size=args.batch_size, dry_run=args.dry_run)
@@ -0,0 +1,98 @@
+import json
+import logging
+import os
+import re
+from pymongo import UpdateOne
+
+from cache import TTLCache
+from database import run_db
+from timestamps import utcnow
+
+logger = logging.getLogger(__name__)
+
+NUTRITION_CACHE_TTL = int(os.getenv("NUTRITION_CACHE_TTL", str(30 * 24 * 3600)))
+NUTRITION_CACHE_SIZE = int(os.getenv("NUTRITION_CACHE_SIZE", "5000"))
+NUTRITION_SEED_FILE = os.getenv("NUTRITION_SEED_FILE", os.path.join("data", "nutrition_seed.json"))
+
+NUTRIENT_FIELDS = ("calories", "protein", "fats", "carbs")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _singular(word):
+    if len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "sses", "xes", "oes")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def normalize_food_name(food_item):
+    """Cache key for a food: case-folded, whitespace-collapsed, last word singularised."""
+    words = _WHITESPACE.sub(" ", food_item.casefold()).strip().split(" ")
+    words[-1] = _singular(words[-1])
+    return " ".join(words)
+
+
+class NutritionCache:
+    """Two-tier cache of parsed nutrient dicts: in-process LRU in front of a Mongo collection.
+
+    Mongo documents are keyed by the normalized food name and carry a ``created_at`` date
+    so the TTL index declared in indexes.py can expire them.
+    """
+
+    def __init__(self, collection, maxsize=NUTRITION_CACHE_SIZE, ttl=NUTRITION_CACHE_TTL):
+        self.collection = collection
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.db_hits = 0
+
+    async def get(self, food_item):
+        """Return ``(nutrients, tier)`` where tier is "memory", "db" or None on a miss."""
+        key = normalize_food_name(food_item)
+        nutrients = self.memory.get(key)
+        if nutrients is not None:
+            return nutrients, "memory"
+        doc = await run_db(self.collection.find_one, {"_id": key})
+        if not doc:
+            return None, None
+        nutrients = {field: doc.get(field, 0.0) for field in NUTRIENT_FIELDS}
+        self.memory.set(key, nutrients)
+        self.db_hits += 1
+        return nutrients, "db"
+
+    async def set(self, food_item, nutrients):
+        key = normalize_food_name(food_item)
+        nutrients = {field: float(nutrients.get(field, 0.0)) for field in NUTRIENT_FIELDS}
+        self.memory.set(key, nutrients)
+        await run_db(
+            self.collection.update_one,
+            {"_id": key},
+            {"$set": {**nutrients, "created_at": utcnow()}},
+            upsert=True
+        )
+
+    def warm(self, path=NUTRITION_SEED_FILE):
+        """Bulk-load a JSON seed file (list of {food_item, calories, protein, fats, carbs})."""
+        if not path or not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            entries = json.load(f)
+        now = utcnow()
+        operations = []
+        for entry in entries:
+            key = normalize_food_name(entry["food_item"])
+            nutrients = {field: float(entry.get(field, 0.0)) for field in NUTRIENT_FIELDS}
+            self.memory.set(key, nutrients)
+            operations.append(UpdateOne({"_id": key}, {"$set": {**nutrients, "created_at": now}}, upsert=True))
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+        logger.info(f"Nutrition cache warmed with {len(operations)} entries from {path}")
+        return len(operations)
+
+    def stats(self):
+        return {**self.memory.stats(), "db_hits": self.db_hits}
@@ -0,0 +1,68 @@
+import os
+from typing import Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Query
+
+from database import find_all
+
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "50"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "200"))
+
+
+class PageParams:
+    """Query parameters shared by every paginated list endpoint (use with ``Depends()``)."""
+
+    def __init__(
+        self,
+        after: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+        limit: int = Query(PAGE_SIZE_DEFAULT, ge=1),
+        fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    ):
+        self.after = after
+        self.limit = min(limit, PAGE_SIZE_MAX)
+        self.fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+
+def projection_for(page: PageParams, allowed_fields, default_exclude=()):
+    if page.fields:
+        unknown = set(page.fields) - set(allowed_fields)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        return {"_id": 1, **dict.fromkeys(page.fields, 1)}
+    if default_exclude:
+        return dict.fromkeys(default_exclude, 0)
+    return None
+
+
+async def fetch_page(collection, query, page: PageParams, allowed_fields, include_id=False, default_exclude=()):
+    """Keyset pagination on ``_id``, newest first.
+
+    Returns ``(docs, next_cursor)``; ``next_cursor`` is None on the last page. ``_id`` is
+    always read to build the cursor and only returned (as a string) when ``include_id``.
+    """
+    query = dict(query)
+    if page.after:
+        try:
+            query["_id"] = {"$lt": ObjectId(page.after)}
+        except InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    docs = await find_all(
+        collection, query, projection_for(page, allowed_fields, default_exclude),
+        sort=[("_id", -1)], limit=page.limit + 1
+    )
+    next_cursor = str(docs[page.limit - 1]["_id"]) if len(docs) > page.limit else None
+    docs = docs[:page.limit]
+    for doc in docs:
+        if include_id:
+            doc["_id"] = str(doc["_id"])
+        else:
+            del doc["_id"]
+    return docs, next_cursor
+
+
+def set_cursor_header(response, next_cursor):
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
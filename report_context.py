@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
+
+from log_aggregates import week_key
+
+REPORT_CONTEXT_TOKEN_BUDGET = int(os.getenv("REPORT_CONTEXT_TOKEN_BUDGET", "3000"))
+REPORT_RECENT_LOGS = int(os.getenv("REPORT_RECENT_LOGS", "14"))
+REPORT_RECENT_ANALYSES = int(os.getenv("REPORT_RECENT_ANALYSES", "3"))
+
+# Rough size estimate used to turn the token budget into a character budget.
+CHARS_PER_TOKEN = 4
+# Share of the budget given to each section; unused space is not carried over.
+SECTION_SHARES = {"weekly": 0.45, "recent": 0.35, "analyses": 0.20}
+
+METRICS = ("sleep", "water", "exercise")
+
+
+def _week_of(timestamp):
+    try:
+        return week_key(timestamp)
+    except ValueError:
+        return "unknown"
+
+
+class _WeekStats:
+    __slots__ = ("count", "totals", "mins", "maxs", "moods")
+
+    def __init__(self):
+        self.count = 0
+        self.totals = dict.fromkeys(METRICS, 0.0)
+        self.mins = dict.fromkeys(METRICS)
+        self.maxs = dict.fromkeys(METRICS)
+        self.moods = Counter()
+
+    def add(self, log):
+        self.count += 1
+        for metric in METRICS:
+            value = float(log.get(metric) or 0)
+            self.totals[metric] += value
+            self.mins[metric] = value if self.mins[metric] is None else min(self.mins[metric], value)
+            self.maxs[metric] = value if self.maxs[metric] is None else max(self.maxs[metric], value)
+        self.moods[str(log.get("mood", "N/A")).strip()] += 1
+
+    def summary(self, week):
+        data = {"week": week, "logs": self.count}
+        for metric in METRICS:
+            data[metric] = {
+                "mean": round(self.totals[metric] / self.count, 2),
+                "min": self.mins[metric],
+                "max": self.maxs[metric],
+            }
+        data["moods"] = dict(self.moods.most_common())
+        return data
+
+
+def weekly_summaries(logs):
+    """Per-ISO-week mean/min/max for sleep, water and exercise plus a mood histogram.
+
+    One pass over ``logs`` (any iterable); memory is proportional to the number of weeks.
+    Returned newest week first.
+    """
+    weeks = {}
+    for log in logs:
+        week = _week_of(log.get("timestamp"))
+        stats = weeks.get(week)
+        if stats is None:
+            stats = weeks[week] = _WeekStats()
+        stats.add(log)
+    return [weeks[week].summary(week) for week in sorted(weeks, reverse=True)]
+
+
+def _fill(items, budget):
+    """Take items (already newest first) while their serialized size fits ``budget`` chars."""
+    lines, used = [], 0
+    for item in items:
+        line = item if isinstance(item, str) else json.dumps(item, default=str, separators=(",", ":"))
+        if used + len(line) + 1 > budget:
+            break
+        lines.append(line)
+        used += len(line) + 1
+    return lines
+
+
+def build_report_context(logs, analyses, token_budget=REPORT_CONTEXT_TOKEN_BUDGET,
+                         recent_logs=REPORT_RECENT_LOGS):
+    """Bounded prompt context for the report summary.
+
+    ``logs`` is any iterable (e.g. a cursor) in chronological order and is read once;
+    ``analyses`` are newest first. Whatever the size of the user's history, the result
+    stays within roughly ``token_budget`` tokens.
+    """
+    budget = token_budget * CHARS_PER_TOKEN
+    tail = deque(maxlen=recent_logs)
+    seen = 0
+
+    def tap():
+        nonlocal seen
+        for log in logs:
+            seen += 1
+            tail.append(log)
+            yield log
+
+    summaries = weekly_summaries(tap())
+    weekly = _fill(summaries, int(budget * SECTION_SHARES["weekly"]))
+    recent = _fill(reversed(tail), int(budget * SECTION_SHARES["recent"]))
+
+    analyses_budget = int(budget * SECTION_SHARES["analyses"])
+    per_analysis = analyses_budget // max(len(analyses), 1) - 1
+    previous = _fill(
+        [f"Analysis from {a.get('timestamp')}: {a.get('analysis', 'No analysis available')}"[:per_analysis] for a in analyses],
+        analyses_budget
+    )
+    return (
+        f"Weekly Summaries (newest first, {len(weekly)} of {len(summaries)} weeks):\n"
+        + ("\n".join(weekly) or "No logs available.")
+        + f"\nMost Recent Logs (newest first, {len(recent)} of {seen}):\n"
+        + ("\n".join(recent) or "No logs available.")
+        + "\nPrevious Analyses (newest first):\n"
+        + ("\n".join(previous) or "No previous analyses available.")
+    )
+
+
+def _synthetic_history(count, analyses=50):
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    moods = ("Happy", "Neutral", "Tired", "Stressed")
+    logs = [
+        {"timestamp": start + timedelta(hours=6 * i), "mood": moods[i % 4], "sleep": 6 + i % 3,
+         "water": 1.5 + i % 2, "exercise": 20 * (i % 4), "note": f"Synthetic log {i}"}
+        for i in range(count)
+    ]
+    reports = [
+        {"timestamp": start + timedelta(days=30 * i), "analysis": "- **Condition**: Stable\n" * 20}
+        for i in range(analyses)
+    ][::-1]
+    return logs, reports
+
+
+def _full_history(logs, analyses):
+    """The context the report prompt used to embed: every log and every earlier analysis."""
+    analyses_text = "\n".join(f"Analysis from {a['timestamp']}: {a.get('analysis', 'No analysis available')}" for a in analyses)
+    return f"Logs:\n{json.dumps(logs, indent=2, default=str)}\nPrevious Analyses:\n{analyses_text}"
+
+
+async def _bench(log_counts, base_latency, seconds_per_kchar):
+    """Prompt size and end-to-end latency through LLMClient with a FakeBackend.
+
+    The fake model's latency grows with the prompt: ``base_latency`` plus
+    ``seconds_per_kchar`` per 1,000 prompt characters.
+    """
+    from llm import FakeBackend, LLMClient
+
+    for count in log_counts:
+        logs, analyses = _synthetic_history(count)
+        for label, build in (("full", _full_history), ("bounded", build_report_context)):
+            start = time.perf_counter()
+            prompt = f"Generate a detailed health report summary based on the following data:\n{build(logs, analyses)}"
+            build_seconds = time.perf_counter() - start
+            size = len(prompt.encode("utf-8"))
+            client = LLMClient(FakeBackend(text="ok", latency=base_latency + seconds_per_kchar * len(prompt) / 1000), timeout=3600)
+            await client.generate("gemini-1.5-pro", prompt)
+            print(f"{count} logs, {label}: prompt {size} bytes, context {build_seconds * 1000:.1f}ms, "
+                  f"end-to-end {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark report prompt context")
+    parser.add_argument("--logs", type=int, nargs="+", default=[10, 10_000])
+    parser.add_argument("--base-latency", type=float, default=0.5, help="Fake model latency per call (s)")
+    parser.add_argument("--seconds-per-kchar", type=float, default=0.01, help="Fake model latency per 1,000 prompt chars (s)")
+    args = parser.parse_args()
+    asyncio.run(_bench(args.logs, args.base_latency, args.seconds_per_kchar))
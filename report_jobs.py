@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "2"))
+REPORT_JOB_MAX_PENDING = int(os.getenv("REPORT_JOB_MAX_PENDING", "32"))
+REPORT_JOB_RETENTION = int(os.getenv("REPORT_JOB_RETENTION", "3600"))
+
+
+class ReportJob:
+    def __init__(self, user_id, payload):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.payload = payload
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def update(self, stage, progress):
+        self.stage = stage
+        self.progress = progress
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+        }
+        if self.result is not None:
+            data.update(self.result)
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class ReportJobQueue:
+    """In-process job queue for report generation.
+
+    ``handler(job)`` is awaited by a fixed number of worker tasks, so at most ``workers``
+    reports are built at once, and at most ``max_pending`` more wait in the queue; further
+    submissions raise ``asyncio.QueueFull`` so bursts are rejected instead of buffered.
+    Finished jobs are kept for ``retention`` seconds for status polling.
+    """
+
+    def __init__(self, handler, workers=REPORT_JOB_WORKERS, max_pending=REPORT_JOB_MAX_PENDING, retention=REPORT_JOB_RETENTION):
+        self.handler = handler
+        self.workers = workers
+        self.retention = retention
+        self.jobs = {}
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, user_id, **payload):
+        self._purge()
+        job = ReportJob(user_id, payload)
+        self._queue.put_nowait(job)
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def _purge(self):
+        cutoff = time.time() - self.retention
+        for job_id in [j.id for j in self.jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            try:
+                job.result = await self.handler(job)
+                job.status = "succeeded"
+                job.update("done", 100)
+            except Exception as e:
+                logger.error(f"Report job {job.id} failed: {str(e)}", exc_info=True)
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.payload = None
+                job.finished_at = time.time()
+                self._queue.task_done()
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "pending": self._queue.qsize(),
+            "max_pending": self._queue.maxsize,
+            "tracked_jobs": len(self.jobs),
+        }
@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import io
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+logger = logging.getLogger(__name__)
+
+REPORT_RENDER_PROCESSES = int(os.getenv("REPORT_RENDER_PROCESSES", str(os.cpu_count() or 1)))
+REPORT_LOG_CHUNK_ROWS = int(os.getenv("REPORT_LOG_CHUNK_ROWS", "250"))
+REPORT_LOG_BATCH_SIZE = int(os.getenv("REPORT_LOG_BATCH_SIZE", "500"))
+
+# --- Precomputed Styles ---
+# Built once per process at import time instead of once per report.
+_styles = getSampleStyleSheet()
+HEADING_STYLE = _styles["Heading1"]
+NORMAL_STYLE = _styles["Normal"]
+ITALIC_STYLE = _styles["Italic"]
+
+LOG_TABLE_HEADER = ["Timestamp", "Mood", "Sleep (hrs)", "Water (L)", "Exercise (min)", "Note"]
+LOG_TABLE_COL_WIDTHS = [90, 60, 60, 60, 70, 110]
+LOG_TABLE_STYLE = TableStyle([
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+    ('LEFTPADDING', (0, 0), (-1, -1), 5),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 5),
+    ('TOPPADDING', (0, 0), (-1, -1), 5),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+])
+
+
+NO_LOGS_ROW = {"mood": "N/A", "sleep": 0, "water": 0, "exercise": 0, "note": "No logs available"}
+
+
+def _format_timestamp(value):
+    if isinstance(value, datetime):
+        return value.astimezone().strftime("%Y-%m-%d %H:%M")
+    return str(value)
+
+
+def log_row(log):
+    return [
+        _format_timestamp(log.get("timestamp", "N/A")),
+        log.get("mood", "N/A").replace("Z", "").strip(),
+        str(log.get("sleep", 0)),
+        str(log.get("water", 0)),
+        str(log.get("exercise", 0)),
+        log.get("note", "N/A")
+    ]
+
+
+def log_tables(logs, chunk_rows=REPORT_LOG_CHUNK_ROWS):
+    """Yield one Table per ``chunk_rows`` logs, each with its own header row.
+
+    ReportLab lays out a table as a whole, so one huge table costs far more than the sum
+    of many small ones; fixed-size chunks keep layout time linear in the number of logs.
+    """
+    chunk, rows = [LOG_TABLE_HEADER], 0
+    for log in logs:
+        chunk.append(log_row(log))
+        rows += 1
+        if len(chunk) > chunk_rows:
+            yield _log_table(chunk)
+            chunk = [LOG_TABLE_HEADER]
+    if not rows:
+        chunk.append(log_row({"timestamp": datetime.now().astimezone(), **NO_LOGS_ROW}))
+    if len(chunk) > 1:
+        yield _log_table(chunk)
+
+
+def _log_table(rows):
+    table = Table(rows, colWidths=LOG_TABLE_COL_WIDTHS, repeatRows=1)
+    table.setStyle(LOG_TABLE_STYLE)
+    return table
+
+
+# --- Log Sources ---
+# A report's logs are either a list (supplied with the request) or a query spec that the
+# rendering process runs itself, so a long history is never materialized or pickled.
+_worker_db_handle = None
+
+
+def log_query(collection_name, query, fields, sort=(("timestamp", 1),)):
+    return {"collection": collection_name, "query": query, "fields": fields, "sort": list(sort)}
+
+
+def _worker_db():
+    global _worker_db_handle
+    if _worker_db_handle is None:
+        from database import MONGO_DB_NAME, create_client
+        _worker_db_handle = create_client(maxPoolSize=1).get_database(MONGO_DB_NAME)
+    return _worker_db_handle
+
+
+def iter_logs(log_source):
+    if isinstance(log_source, dict):
+        collection = _worker_db()[log_source["collection"]]
+        return collection.find(log_source["query"], log_source["fields"], sort=log_source["sort"]).batch_size(REPORT_LOG_BATCH_SIZE)
+    return iter(log_source or ())
+
+
+class FlowableStream(list):
+    """Flowable list for ``doc.build()`` that is filled from an iterator as it is consumed.
+
+    build() pops flowables off the front and only looks ahead across keepWithNext runs,
+    so a short buffer lets each log table be laid out and released before the next is built.
+    """
+
+    def __init__(self, flowables, lookahead=2):
+        super().__init__()
+        self._source = iter(flowables)
+        self._lookahead = lookahead
+
+    def _fill(self, size):
+        while self._source is not None and (super().__len__() < size or self._last_keeps_with_next()):
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+
+    def _last_keeps_with_next(self):
+        return super().__len__() and super().__getitem__(-1).getKeepWithNext()
+
+    def __len__(self):
+        self._fill(self._lookahead)
+        return super().__len__()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            self._fill(index.stop if index.stop is not None and index.stop >= 0 else float("inf"))
+        else:
+            self._fill(index + 1 if index >= 0 else float("inf"))
+        return super().__getitem__(index)
+
+
+def _report_flowables(username, report_id, log_source, ai_analysis, period):
+    yield Paragraph("HealthChain Medical Report", HEADING_STYLE)
+    yield Spacer(1, 20)
+    yield Paragraph(f"Patient Name: {username}", NORMAL_STYLE)
+    yield Paragraph(f"Report ID: {report_id}", NORMAL_STYLE)
+    yield Paragraph(f"Date of Issue: {datetime.now().strftime('%B %d, %Y %H:%M:%S')}", NORMAL_STYLE)
+    if period:
+        yield Paragraph(f"Period: {period}", NORMAL_STYLE)
+    yield Spacer(1, 20)
+    yield Paragraph("Health Logs", HEADING_STYLE)
+    yield Spacer(1, 10)
+
+    yield from log_tables(iter_logs(log_source))
+    yield Spacer(1, 20)
+
+    yield Paragraph("AI Analysis Report", HEADING_STYLE)
+    yield Spacer(1, 10)
+    for line in ai_analysis.split("\n"):
+        if line.strip():
+            yield Paragraph(line, ITALIC_STYLE if "Disclaimer" in line else NORMAL_STYLE)
+    yield Spacer(1, 20)
+
+
+def build_report(target, username, report_id, log_source, ai_analysis, period=None):
+    """Render the report into ``target`` (a file path or a writable binary file object).
+
+    ``log_source`` is a list of logs or a ``log_query()`` spec read through a cursor.
+    """
+    doc = SimpleDocTemplate(target, pagesize=letter)
+    doc.build(FlowableStream(_report_flowables(username, report_id, log_source, ai_analysis, period)))
+
+
+def render_to_file(path, username, report_id, log_source, ai_analysis, period=None):
+    build_report(path, username, report_id, log_source, ai_analysis, period)
+    return path
+
+
+def render_to_bytes(username, report_id, log_source, ai_analysis, period=None):
+    buffer = io.BytesIO()
+    build_report(buffer, username, report_id, log_source, ai_analysis, period)
+    return buffer.getvalue()
+
+
+# --- Process Pool ---
+# ReportLab layout is CPU-bound and holds the GIL, so reports render in worker processes.
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=REPORT_RENDER_PROCESSES)
+    return _executor
+
+
+async def render_report(username, report_id, log_source, ai_analysis, path=None, period=None):
+    """Render in the process pool; returns ``path`` when given, otherwise the PDF bytes."""
+    loop = asyncio.get_running_loop()
+    if path:
+        return await loop.run_in_executor(get_executor(), render_to_file, path, username, str(report_id), log_source, ai_analysis, period)
+    return await loop.run_in_executor(get_executor(), render_to_bytes, username, str(report_id), log_source, ai_analysis, period)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+BENCH_ANALYSIS = (
+    "- **Condition**: Stable\n"
+    "- **Description**: Synthetic logs for benchmarking.\n"
+    "Disclaimer: Not a substitute for professional medical advice."
+)
+
+
+def _synthetic_logs(rows):
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    moods = ("Happy", "Neutral", "Tired", "Stressed")
+    for i in range(rows):
+        yield {"timestamp": start + timedelta(hours=6 * i), "mood": moods[i % 4], "sleep": 7.5,
+               "water": 2, "exercise": 30, "note": f"Synthetic log {i}"}
+
+
+def _bench_render(rows):
+    import resource
+    start = time.perf_counter()
+    pdf = render_to_bytes("Benchmark User", "bench", _synthetic_logs(rows), BENCH_ANALYSIS)
+    return time.perf_counter() - start, len(pdf), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _bench(row_counts):
+    """Render time and peak memory per report size; Mongo and the LLM are not involved."""
+    for rows in row_counts:
+        # A fresh process per size, so its max RSS is the peak of this render alone.
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            seconds, size, max_rss = executor.submit(_bench_render, rows).result()
+        print(f"{rows} rows: {seconds:.2f}s on one core ({rows / seconds:.0f} rows/s), "
+              f"{size / 1024:.0f} KiB PDF, max RSS {max_rss / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report renderer tools")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 1_000, 50_000], help="Log rows per benchmark report")
+    args = parser.parse_args()
+    _bench(args.rows)
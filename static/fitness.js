@@ -41,7 +41,8 @@ class FitnessPlan {
       if (!response.ok) {
         throw new Error(`HTTP error ${response.status}`);
       }
-      this.fitness = await response.json();
+      // The API pages newest first; the page lists entries in chronological order.
+      this.fitness = (await response.json()).reverse();
       this.updateView();
       this.getFitnessPlan(); // Load plan on initial load
       this.getProgress(); // Load progress on initial load
@@ -57,7 +57,8 @@ class Forum {
       if (!response.ok) {
         throw new Error(`HTTP error ${response.status}`);
       }
-      this.posts = await response.json();
+      // The API pages newest first; the page lists entries in chronological order.
+      this.posts = (await response.json()).reverse();
       this.updateView();
     } catch (error) {
       console.error("Failed to load posts:", error);
@@ -41,7 +41,8 @@ class NutritionTracker {
       }
       const data = await response.json();
       console.log("API Response:", data);
-      this.nutrition = Array.isArray(data.entries) ? [...data.entries] : [];
+      // The API pages newest first; the page lists entries in chronological order.
+      this.nutrition = Array.isArray(data.entries) ? [...data.entries].reverse() : [];
       this.updateSummary(data.today_summary || { calories: 0, protein: 0, fats: 0, carbs: 0, suggestion: "" });
       this.updateHistory();
     } catch (error) {
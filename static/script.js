@@ -78,7 +78,8 @@ class HealthChain {
       if (!logsResponse.ok) {
         throw new Error(`HTTP error ${logsResponse.status}`);
       }
-      this.logs = await logsResponse.json();
+      // The API pages newest first; the dashboard works in chronological order.
+      this.logs = (await logsResponse.json()).reverse();
 
       const medsResponse = await this.fetchWithRetry("/api/meds", { credentials: "include" });
       if (medsResponse.status === 401 || medsResponse.status === 302) {
@@ -88,7 +89,7 @@ class HealthChain {
       if (!medsResponse.ok) {
         throw new Error(`HTTP error ${medsResponse.status}`);
       }
-      this.meds = await medsResponse.json();
+      this.meds = (await medsResponse.json()).reverse();
 
       const blockchainResponse = await this.fetchWithRetry("/api/blockchain/status", { credentials: "include" });
       if (blockchainResponse.status === 401 || blockchainResponse.status === 302) {
@@ -445,7 +446,8 @@ class HealthChain {
 
   async saveBlockchain() {
     try {
-      const chainData = this.blockchain.chain.map(block => ({
+      // The server keeps the full chain; only the block just added needs to be sent.
+      const chainData = [this.blockchain.getLatestBlock()].map(block => ({
         index: block.index,
         timestamp: block.timestamp,
         data: block.data,
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import mongomock
+import pymongo
+
+# main.py and database.py connect and read settings at import time: point them at an
+# in-memory mongomock server and a fake LLM before anything imports them. main.py also
+# opens data/ and static/ relative to the working directory.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("EMAIL_USER", "test@localhost")
+os.environ.setdefault("EMAIL_PASS", "test")
+os.environ["LLM_BACKEND"] = "fake"
+pymongo.MongoClient = mongomock.MongoClient
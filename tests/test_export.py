@@ -0,0 +1,28 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+import main
+from timestamps import parse_timestamp, utcnow
+
+
+def test_exported_timestamps_are_iso_8601():
+    user_id = main.users_collection.insert_one(
+        {"username": "export-user", "session_id": "export-session", "session_expiry": utcnow() + timedelta(days=1)}
+    ).inserted_id
+    logged_at = datetime(2026, 3, 1, 8, 30, tzinfo=timezone.utc)
+    main.logs_collection.insert_one({"user_id": str(user_id), "timestamp": logged_at, "mood": "Happy"})
+    client = TestClient(main.app)
+    client.cookies.set("session_id", "export-session")
+    try:
+        response = client.get("/api/export", params={"collections": "logs"})
+    finally:
+        main.logs_collection.delete_many({"user_id": str(user_id)})
+        main.users_collection.delete_one({"_id": user_id})
+
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 1
+    assert "T" in rows[0]["timestamp"]
+    assert parse_timestamp(rows[0]["timestamp"]) == logged_at
@@ -0,0 +1,29 @@
+import threading
+from datetime import timedelta
+
+from fastapi.testclient import TestClient
+
+import main
+from timestamps import utcnow
+
+
+def test_full_validation_runs_off_the_database_executor(monkeypatch):
+    user_id = main.users_collection.insert_one(
+        {"username": "ledger-full", "session_id": "ledger-full-session", "session_expiry": utcnow() + timedelta(days=1)}
+    ).inserted_id
+    threads = []
+
+    def verify_parallel(user_id):
+        threads.append(threading.current_thread().name)
+        return {"valid": True, "checked": 0}
+
+    monkeypatch.setattr(main.chain_ledger, "verify_parallel", verify_parallel)
+    client = TestClient(main.app)
+    client.cookies.set("session_id", "ledger-full-session")
+    try:
+        response = client.get("/api/blockchain/validate", params={"full": "true"})
+    finally:
+        main.users_collection.delete_one({"_id": user_id})
+
+    assert response.status_code == 200 and response.json()["valid"]
+    assert len(threads) == 1 and threads[0].startswith("ledger-verify")
@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta, timezone
+
+import database
+import report_renderer
+
+
+def test_stored_log_reports_render_repeatedly_in_one_process(monkeypatch):
+    # mongomock keeps data per client, so the render process must reuse the seeded one.
+    monkeypatch.setattr(database, "create_client", lambda **overrides: database.client)
+    monkeypatch.setattr(report_renderer, "REPORT_RENDER_PROCESSES", 1)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    database.logs_collection.insert_many([
+        {"user_id": "render-user", "timestamp": start + timedelta(days=i), "mood": "Happy",
+         "sleep": 7, "water": 2, "exercise": 30, "note": f"log {i}"}
+        for i in range(20)
+    ])
+    source = report_renderer.log_query(database.logs_collection.name, {"user_id": "render-user"}, {"_id": 0, "user_id": 0})
+
+    report_renderer.shutdown()
+    try:
+        executor = report_renderer.get_executor()
+        for report_id in ("first", "second"):
+            pdf = executor.submit(report_renderer.render_to_bytes, "User", report_id, source, "Condition: Stable").result()
+            assert pdf.startswith(b"%PDF")
+    finally:
+        report_renderer.shutdown()
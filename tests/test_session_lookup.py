@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from cache import TTLCache
+from timestamps import utcnow
+
+
+class CountingCollection:
+    """Collection wrapper that counts the find/find_one calls that reach Mongo."""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.finds = 0
+
+    def find_one(self, *args, **kwargs):
+        self.finds += 1
+        return self._collection.find_one(*args, **kwargs)
+
+    def find(self, *args, **kwargs):
+        self.finds += 1
+        return self._collection.find(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+
+@pytest.fixture
+def accounts(monkeypatch):
+    expiry = utcnow() + timedelta(days=1)
+    user_id = main.users_collection.insert_one(
+        {"username": "lookup-patient", "session_id": "lookup-patient-session", "session_expiry": expiry}
+    ).inserted_id
+    doctor_id = main.doctors_collection.insert_one(
+        {"name": "Dr Lookup", "email": "lookup@localhost", "session_id": "lookup-doctor-session", "session_expiry": expiry}
+    ).inserted_id
+    users = CountingCollection(main.users_collection)
+    doctors = CountingCollection(main.doctors_collection)
+    monkeypatch.setattr(main, "users_collection", users)
+    monkeypatch.setattr(main, "doctors_collection", doctors)
+    # A zero-size cache drops every entry on insert, so each request is a cache miss and
+    # only the request.state memo stands between the middleware and a second find_one.
+    monkeypatch.setattr(main, "session_cache", TTLCache(maxsize=0))
+    monkeypatch.setattr(main, "doctor_session_cache", TTLCache(maxsize=0))
+    yield users, doctors
+    users._collection.delete_one({"_id": user_id})
+    doctors._collection.delete_one({"_id": doctor_id})
+
+
+def test_patient_request_looks_up_session_once(accounts):
+    users, doctors = accounts
+    client = TestClient(main.app)
+    client.cookies.set("session_id", "lookup-patient-session")
+
+    # check_session middleware and the get_session dependency both need the account.
+    assert client.get("/api/logs").status_code == 200
+    assert (users.finds, doctors.finds) == (1, 0)
+
+    assert client.get("/api/logs").status_code == 200
+    assert (users.finds, doctors.finds) == (2, 0)
+
+
+def test_doctor_request_looks_up_session_once(accounts):
+    users, doctors = accounts
+    client = TestClient(main.app)
+    client.cookies.set("doctor_session_id", "lookup-doctor-session")
+
+    assert client.get("/api/doctors/appointments").status_code == 200
+    assert (users.finds, doctors.finds) == (0, 1)
+
+    assert client.get("/api/doctors/appointments").status_code == 200
+    assert (users.finds, doctors.finds) == (0, 2)
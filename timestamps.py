@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta, timezone
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+def parse_timestamp(value):
+    """Coerce a stored or client-supplied timestamp to an aware UTC datetime.
+
+    Accepts datetimes and ISO-8601 strings (with or without 'Z'/offset, 'T' or space
+    separated). Naive values are taken as server-local time, which is how the legacy
+    ``str(datetime.now())`` strings were written. Raises ValueError for anything else.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str) and value.strip():
+        text = value.strip()
+        if text.endswith("Z"):
+            text = text[:-1] + "+00:00"
+        parsed = datetime.fromisoformat(text)
+    else:
+        raise ValueError(f"Unparseable timestamp: {value!r}")
+    return parsed.astimezone(timezone.utc)
+
+
+def local_day_bounds(day=None):
+    """UTC [start, end) of a server-local calendar day (today by default)."""
+    day = day or datetime.now().date()
+    following = day + timedelta(days=1)
+    start = datetime(day.year, day.month, day.day).astimezone(timezone.utc)
+    end = datetime(following.year, following.month, following.day).astimezone(timezone.utc)
+    return start, end
+
+
+def local_date(value):
+    """Server-local calendar date of a timestamp."""
+    return parse_timestamp(value).astimezone().date()